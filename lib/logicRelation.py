@@ -10,6 +10,13 @@
 
 from lib.display import Displayable
 import lib.logicProblem
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from heapq import nlargest
+from numbers import Real
+from time import perf_counter
+import csv
 
 class Var(Displayable):
     """A logical variable"""
@@ -95,6 +102,8 @@ def apply(e,sub):
     """e is an expression
     sub is a {var:val} dictionary
     returns e with all occurrence of var replaces with val"""
+    if not sub:
+        return e
     if isinstance(e,Var) and e in sub:
         return sub[e]
     if isinstance(e,Atom):
@@ -108,6 +117,34 @@ def apply(e,sub):
     else:
         return e
 
+def match_fact(args, values):
+    """a fast unify for an atom with arguments args against a fact with arguments values
+    returns the substitution, False if they do not unify, or None if some argument
+    is a compound term (and unify has to be used)"""
+    if len(args) != len(values):
+        return False
+    sub = {}
+    for a,v in zip(args,values):
+        if isinstance(a,Var):
+            if a in sub:
+                if sub[a] != v:
+                    return False
+            else:
+                sub[a] = v
+        elif isinstance(a,(Atom,list,tuple)) or isinstance(v,(Atom,list,tuple)):
+            return None
+        elif a != v:
+            return False
+    return sub
+
+def term_key(e):
+    """a hashable representation of expression e, equal for structurally equal expressions"""
+    if isinstance(e,Atom):
+        return (Atom, e.name, term_key(e.args))
+    if isinstance(e,(list,tuple)):
+        return tuple(term_key(a) for a in e)
+    return e
+
 ### Test cases:
 # unifdisp.max_display_level = 2   # show trace
 e1 = Atom('p',[Var('X'),Var('Y'),Var('Y')])
@@ -118,72 +155,764 @@ e3 = Atom('p',['a',Var('Y'),Var('Y')])
 e4 = Atom('p',[Var('Z'),Var('Z'),'b'])
 # unify(e3,e4)
 
+def plan_key(lst, end):
+    """returns the bound-argument pattern of the list of atoms lst: the predicate
+    names, with the constants abstracted and the variables numbered by first occurrence.
+    Returns None if one of the first end atoms (other than an aggregate) has a
+    function symbol."""
+    numbering = {}
+    key = [end]
+    for i,atom in enumerate(lst):
+        if atom.name in AGGREGATES:
+            key.append(atom.name)
+            continue
+        args = []
+        for a in atom.args:
+            if isinstance(a,Var):
+                args.append(numbering.setdefault(a, len(numbering)))
+            elif is_constant(a):
+                args.append(None)
+            elif i < end:
+                return None
+            else:
+                args.append(str(a))
+        key.append((atom.name, tuple(args)))
+    return tuple(key)
+
+def is_constant(e):
+    """true if e is a hashable constant (not a variable or a compound term)"""
+    if isinstance(e,(str,int,float)):
+        return True
+    if isinstance(e,(Var,Atom,list,tuple,dict,set)):
+        return False
+    try:
+        hash(e)
+    except TypeError:
+        return False
+    return True
+
+def is_number(e):
+    """true if e is a number that can be kept in a sorted numeric column.
+    Any real number type is accepted (e.g. NumPy scalars read from a DataFrame);
+    booleans are included (as 0 and 1), as the comparison built-ins accept them;
+    NaN is excluded, as every comparison with it fails."""
+    return isinstance(e,Real) and e == e
+
+class NumericColumn(object):
+    """The facts of a predicate sorted on the numeric value of one argument.
+    keys is a sorted array of the values, parallel to entries, so range
+    queries are bisections. Bulk additions are sorted on the first query."""
+    def __init__(self):
+        self.entries = []   # (value, sequence number, clause)
+        self.keys = None    # array of the values in entries, None until sorted
+        self.added = 0      # number of additions, keeps equal values in insertion order
+
+    def add(self, value, clause):
+        entry = (value, self.added, clause)
+        self.added += 1
+        if self.keys is None:
+            self.entries.append(entry)
+        else:
+            i = bisect_right(self.keys, value)
+            self.entries.insert(i, entry)
+            self.keys.insert(i, value)
+
+    def remove(self, value, clause):
+        keys = self.sorted_keys()
+        for i in range(bisect_left(keys, value), bisect_right(keys, value)):
+            if self.entries[i][2] is clause:
+                del self.entries[i]
+                del keys[i]
+                return
+
+    def sorted_keys(self):
+        if self.keys is None:
+            self.entries.sort(key=lambda e: (e[0], e[1]))
+            self.keys = array('d', (e[0] for e in self.entries))
+        return self.keys
+
+    def bounds(self, low, low_strict, high, high_strict):
+        """returns the (start, end) slice of entries with values between low and high"""
+        keys = self.sorted_keys()
+        start = 0 if low is None else (bisect_right if low_strict else bisect_left)(keys, low)
+        end = len(keys) if high is None else (bisect_left if high_strict else bisect_right)(keys, high)
+        return start, max(start, end)
+
+    def scan(self, low, low_strict, high, high_strict):
+        """returns the clauses with values between low and high"""
+        start, end = self.bounds(low, low_strict, high, high_strict)
+        return [e[2] for e in self.entries[start:end]]
+
+def numeric_bounds(var, atoms):
+    """returns (low, low_strict, high, high_strict), the bounds on var implied by the
+    comparisons between var and a number in atoms, or None if there are none"""
+    low = high = None
+    low_strict = high_strict = False
+    found = False
+    for atom in atoms:
+        if atom.name in ('lt','le') and len(atom.args) == 2:
+            [a1,a2] = atom.args
+            strict = atom.name == 'lt'
+            if a2 == var and is_number(a1):
+                lows, highs = [(a1,strict)], []
+            elif a1 == var and is_number(a2):
+                lows, highs = [], [(a2,strict)]
+            else:
+                continue
+        elif atom.name == 'between' and len(atom.args) == 3 and atom.args[2] == var:
+            lows = [(atom.args[0],False)] if is_number(atom.args[0]) else []
+            highs = [(atom.args[1],False)] if is_number(atom.args[1]) else []
+        else:
+            continue
+        for val,strict in lows:
+            if low is None or val > low or (val == low and strict):
+                low, low_strict = val, strict
+                found = True
+        for val,strict in highs:
+            if high is None or val < high or (val == high and strict):
+                high, high_strict = val, strict
+                found = True
+    return (low, low_strict, high, high_strict) if found else None
+
+def answer_vars(query):
+    """returns the set of the variables of query bound by its answers: all of them
+    except those that only occur in the goal of a count, sum, min or max aggregate,
+    which are local to the aggregate"""
+    outer = set()
+    for atom in query:
+        if atom.name in AGGREGATES and atom.name != 'top_k':
+            outer = log_vars(atom.args[-1], outer)
+        else:
+            outer = log_vars(atom, outer)
+    return outer
+
+def canonical_query(query):
+    """returns (key, qvars) where key is a hashable form of query with the variables
+    renamed by position of first occurrence, and qvars lists the answer variables
+    (see answer_vars) in that order"""
+    qvars = []
+    positions = {}
+    def canon(e):
+        if isinstance(e,Var):
+            if e not in positions:
+                positions[e] = len(qvars)
+                qvars.append(e)
+            return (Var, positions[e])
+        if isinstance(e,Atom):
+            return (Atom, e.name, canon(e.args))
+        if isinstance(e,(list,tuple)):
+            return tuple(canon(a) for a in e)
+        return e
+    key = canon(query)
+    outer = answer_vars(query)
+    return key, [v for v in qvars if v in outer]
+
+def atom_names(exp, names):
+    """adds to the set names the names of the atoms in exp, including atoms nested in arguments"""
+    if isinstance(exp,Atom):
+        names.add(exp.name)
+        atom_names(exp.args, names)
+    elif isinstance(exp,(list,tuple)):
+        for e in exp:
+            atom_names(e, names)
+    return names
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+EXIT = '$exit'   # marker goal: exit(Name) is proved when a call to Name has been answered
+
+# aggregate built-ins: count(Goal,C), sum(V,Goal,S), min(V,Goal,M), max(V,Goal,M), top_k(N,Score,Goal)
+# Goal is an atom or a list of atoms
+AGGREGATES = ['count','sum','min','max','top_k']
+BUILT_INS = frozenset(['lt','le','between','triple']+AGGREGATES)
+
+def aggregate_goal(atom):
+    """returns the goal of aggregate atom as a list of atoms"""
+    goal = atom.args[0] if atom.name == 'count' else atom.args[-1] if atom.name == 'top_k' else atom.args[1]
+    return goal if isinstance(goal,list) else [goal]
+
+class Profiler(object):
+    """per-predicate statistics of the proofs of a KB:
+      calls: number of times an atom of the predicate was selected
+      clause_tries: clauses tried against the selected atoms
+      unifications: clauses whose head unified with the selected atom
+      answers: calls that were proved (once for each answer)
+      time: seconds spent selecting and resolving atoms of the predicate
+      (not including the time spent proving the bodies of its clauses;
+      for aggregates it includes the nested proof of their goal)
+    Answers found in the cache of ask_all are not profiled."""
+    fields = ['calls', 'clause_tries', 'unifications', 'answers', 'time']
+
+    def __init__(self):
+        self.stats = {}
+
+    def entry(self, name):
+        """returns the (mutable) statistics of predicate name"""
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = {'calls':0, 'clause_tries':0, 'unifications':0, 'answers':0, 'time':0.0}
+        return stats
+
+    def reset(self):
+        self.stats.clear()
+
+    def as_dict(self):
+        """returns {name: statistics}, most expensive predicates first"""
+        return {name: dict(stats) for name,stats in
+                    sorted(self.stats.items(), key=lambda item: -item[1]['time'])}
+
+    def rows(self):
+        """returns a list of dictionaries, one per predicate, with a 'predicate' key"""
+        return [dict(predicate=name, **stats) for name,stats in self.as_dict().items()]
+
+    def to_csv(self, file_path):
+        with open(file_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['predicate']+self.fields)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def __str__(self):
+        lines = [f"{'predicate':<20}"+"".join(f"{field:>14}" for field in self.fields)]
+        for row in self.rows():
+            lines.append(f"{row['predicate']:<20}"
+                         +"".join(f"{row[field]:>14}" for field in self.fields[:-1])
+                         +f"{row['time']:>14.6f}")
+        return "\n".join(lines)
+
 class KB(lib.logicProblem.KB):
     """A first-order knowledge base. 
-      only the indexing is changed to index on name of the head."""
-        
+      only the indexing is changed to index on name of the head.
+      Facts whose arguments are all constants are also indexed on each argument.
+      The index doubles as statistics (cardinality and distinct values per argument)
+      used by select_atom to choose the most selective atom of a body.
+      Numeric arguments of facts are also kept in sorted columns, so comparisons
+      (lt, le, between) on an unbound numeric argument become range scans.
+      ask_all caches answers; adding or removing a clause for a predicate invalidates
+      the cached queries that depend on it.
+      Aggregates (see AGGREGATES) are evaluated with a nested proof of their goal;
+      rules using them must be stratified (the goal cannot depend on the head)."""
+    plan_queries = True   # can be overridden in subclasses or instances
+    plan_cache_size = 4096  # maximum number of cached atom selections
+    cache_size = 1024     # maximum number of cached queries; 0 disables the cache
+    profiler = None       # a Profiler while profiling is enabled
+
+    def __init__(self, statements=[]):
+        self.arg_index = {}      # name -> list giving, for each argument, {value: list of facts}
+        self.other_clauses = {}  # name -> clauses that are not in arg_index (rules, non-ground facts)
+        self.num_facts = {}      # name -> number of facts in arg_index
+        self.range_index = {}    # name -> {argument position: NumericColumn}
+        self.unranged = {}       # name -> {argument position: number of facts not in the NumericColumn}
+        self.answer_cache = OrderedDict()  # canonical query -> (answer tuples, predicates it depends on)
+        self.cached_queries = {}  # name -> canonical queries that depend on predicate name
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.aggregate_rules = []  # rules with an aggregate in the body
+        self.plan_cache = {}     # plan_key of a body -> position of the atom to select
+        lib.logicProblem.KB.__init__(self, statements)
+
     def add_clause(self, c):
         """Add clause c to clause dictionary"""
+        self.invalidate(c.head.name)
+        self.plan_cache.clear()
         if c.head.name in self.atom_to_clauses:
             self.atom_to_clauses[c.head.name].append(c)
         else:
             self.atom_to_clauses[c.head.name] = [c]
+        name = c.head.name
+        index = self.arg_index.get(name)
+        if (not c.body and all(is_constant(a) for a in c.head.args)
+                and (index is None or len(index) == len(c.head.args))):
+            if index is None:
+                index = self.arg_index[name] = [{} for a in c.head.args]
+            for pos,val in enumerate(c.head.args):
+                index[pos].setdefault(val,[]).append(c)
+                if is_number(val):
+                    self.range_index.setdefault(name,{}).setdefault(pos,NumericColumn()).add(val,c)
+                elif not isinstance(val,Real):   # NaN is left out as no comparison holds for it
+                    counts = self.unranged.setdefault(name,{})
+                    counts[pos] = counts.get(pos,0)+1
+            self.num_facts[name] = self.num_facts.get(name,0)+1
+        else:
+            self.other_clauses.setdefault(name,[]).append(c)
+        if c.body:
+            if any(a.name in AGGREGATES for a in c.body):
+                self.aggregate_rules.append(c)
+            if self.aggregate_rules:
+                try:
+                    self.check_stratified()
+                except ValueError:
+                    self.remove_clause(c)
+                    raise
+
+    def check_stratified(self):
+        """raises ValueError if the goal of an aggregate depends on the head of its rule"""
+        for c in self.aggregate_rules:
+            for atom in c.body:
+                if atom.name in AGGREGATES and c.head.name in self.dependencies(aggregate_goal(atom)):
+                    raise ValueError(f"{c} is not stratified: the goal of {atom.name} depends on {c.head.name}")
+
+    def remove_clause(self, c):
+        """Remove clause c, or one with the same head and body, from the clause dictionary.
+        returns True if a clause was removed"""
+        key = (term_key(c.head), term_key(c.body))
+        candidates = self.atom_to_clauses.get(c.head.name, []) if c.body else self.clauses_for(c.head)
+        for d in candidates:
+            if d is c or (term_key(d.head), term_key(d.body)) == key:
+                self.atom_to_clauses[c.head.name].remove(d)   # by identity as clauses have no __eq__
+                self._unindex(d)
+                self.plan_cache.clear()
+                if d.body:
+                    self.aggregate_rules = [r for r in self.aggregate_rules if r is not d]
+                self.invalidate(c.head.name)
+                return True
+        return False
+
+    def _unindex(self, c):
+        """remove clause c from arg_index or other_clauses"""
+        name = c.head.name
+        others = self.other_clauses.get(name,[])
+        for i,d in enumerate(others):
+            if d is c:
+                del others[i]
+                return
+        index = self.arg_index[name]
+        for pos,val in enumerate(c.head.args):
+            bucket = index[pos][val]
+            bucket.remove(c)
+            if not bucket:
+                del index[pos][val]
+            if is_number(val):
+                self.range_index[name][pos].remove(val,c)
+            elif not isinstance(val,Real):
+                self.unranged[name][pos] -= 1
+        self.num_facts[name] -= 1
+
+    def stats(self, name):
+        """returns the statistics kept for predicate name"""
+        index = self.arg_index.get(name, [])
+        return {'facts': self.num_facts.get(name,0),
+                'other_clauses': len(self.other_clauses.get(name,[])),
+                'distinct': [len(vals) for vals in index]}
+
+    def range_scans(self, atom, constraints):
+        """generates (position, bounds) for the unbound numeric arguments of atom
+        that are compared with a number in the atoms of constraints.
+        A position where some fact has a value that is not a number (e.g. a string)
+        is not scanned, so that no fact is skipped"""
+        columns = self.range_index.get(atom.name)
+        if columns:
+            unranged = self.unranged.get(atom.name,{})
+            for pos,arg in enumerate(atom.args):
+                if isinstance(arg,Var) and pos in columns and not unranged.get(pos):
+                    bounds = numeric_bounds(arg, constraints)
+                    if bounds:
+                        yield pos, bounds
+
+    def clauses_for(self, atom, constraints=()):
+        """returns the clauses whose head may unify with atom.
+        uses the most selective argument index bucket for the constant arguments of atom,
+        or a range scan for a numeric argument compared in constraints (other atoms of the body)"""
+        best = None
+        index = self.arg_index.get(atom.name)
+        if index and len(index) == len(atom.args):
+            for pos,arg in enumerate(atom.args):
+                if is_constant(arg):
+                    bucket = index[pos].get(arg, [])
+                    if best is None or len(bucket) < len(best):
+                        best = bucket
+            for pos,bounds in self.range_scans(atom, constraints):
+                column = self.range_index[atom.name][pos]
+                start, end = column.bounds(*bounds)
+                if best is None or end-start < len(best):
+                    best = column.scan(*bounds)
+        if best is None:
+            return self.atom_to_clauses.get(atom.name, [])
+        others = self.other_clauses.get(atom.name)
+        return best+others if others else best
+
+    def at_most_one(self, atom):
+        """true if atom has a constant argument and at most one clause can resolve with it
+        (a bound on estimate that only looks at the argument index)"""
+        others = self.other_clauses.get(atom.name)
+        limit = 1-len(others) if others else 1
+        if limit < 0:
+            return False
+        index = self.arg_index.get(atom.name)
+        args = atom.args
+        if index is None or len(index) != len(args) or not self.num_facts[atom.name]:
+            limit -= self.num_facts.get(atom.name,0)
+            return limit >= 0 and any(is_constant(a) for a in args)
+        pos = 0
+        for arg in args:
+            if not isinstance(arg,Var) and is_constant(arg) and len(index[pos].get(arg, ())) <= limit:
+                return True
+            pos += 1
+        return False
+
+    def estimate(self, atom, constraints=()):
+        """estimated number of clauses that resolve with atom.
+        facts: cardinality scaled by the selectivity of each constant argument
+        and of each range on a numeric argument (assuming independent arguments);
+        rules: cheap if called with some constant argument, otherwise
+        see rule_estimate"""
+        facts = self.num_facts.get(atom.name,0)
+        est = facts
+        if facts:
+            index = self.arg_index[atom.name]
+            if len(index) == len(atom.args):
+                for pos,arg in enumerate(atom.args):
+                    if is_constant(arg):
+                        est *= len(index[pos].get(arg, ()))/facts
+                for pos,bounds in self.range_scans(atom, constraints):
+                    start, end = self.range_index[atom.name][pos].bounds(*bounds)
+                    est *= (end-start)/facts
+        others = self.other_clauses.get(atom.name)
+        if others:
+            if any(is_constant(a) for a in atom.args):
+                est += len(others)
+            else:
+                est += sum(self.rule_estimate(c) for c in others)
+        return est
+
+    def rule_estimate(self, c):
+        """estimated cost of calling clause c without constant arguments:
+        the estimate of the most selective relation of its body (the one the
+        proof would start from), where the predicates defined by rules
+        count as large as the largest relation"""
+        largest = max(self.num_facts.values(), default=1)
+        best = largest
+        for atom in c.body:
+            if atom.name not in BUILT_INS and atom.name not in self.other_clauses:
+                best = min(best, self.estimate(atom, c.body))
+        return best
 
     def ask(self, query):
         """self is the current KB
         query is a list of atoms to be proved
         generates {variable:value} dictionary"""
 
-        qvars = list(log_vars(query, set()))
+        qvars = list(answer_vars(query))
         for ans in self.prove(qvars, query):
             yield {x:v for (x,v) in zip(qvars,ans)}
 
     def ask_all(self, query):
         """returns a list of all answers to the query given kb"""
-        return list(self.ask(query))
+        if not self.cache_size:
+            return list(self.ask(query))
+        key, qvars = canonical_query(query)
+        if key in self.answer_cache:
+            self.cache_hits += 1
+            self.answer_cache.move_to_end(key)
+            return [dict(zip(qvars,vals)) for vals in self.answer_cache[key][0]]
+        self.cache_misses += 1
+        answers = list(self.ask(query))
+        deps = self.dependencies(query)
+        self.answer_cache[key] = ([tuple(ans[v] for v in qvars) for ans in answers], deps)
+        for name in deps:
+            self.cached_queries.setdefault(name,set()).add(key)
+        while len(self.answer_cache) > self.cache_size:
+            self._uncache(next(iter(self.answer_cache)))
+        return answers
 
     def ask_one(self, query):
         """returns an answer to the query given kb or None of there are no answers"""
+        if self.cache_size:
+            key, qvars = canonical_query(query)
+            if key in self.answer_cache:
+                self.cache_hits += 1
+                for vals in self.answer_cache[key][0]:
+                    return dict(zip(qvars,vals))
+                return None
         for ans in self.ask(query):
             return ans
 
+    def dependencies(self, query):
+        """returns the set of names of the predicates the answers to query depend on"""
+        deps = set()
+        to_visit = atom_names(query, set())
+        while to_visit:
+            name = to_visit.pop()
+            if name not in deps:
+                deps.add(name)
+                for c in self.other_clauses.get(name,[]):
+                    atom_names(c.body, to_visit)
+        return deps
+
+    def invalidate(self, name):
+        """remove from the cache the queries that depend on predicate name"""
+        for key in list(self.cached_queries.get(name,())):
+            self._uncache(key)
+
+    def _uncache(self, key):
+        answers, deps = self.answer_cache.pop(key)
+        for name in deps:
+            keys = self.cached_queries[name]
+            keys.discard(key)
+            if not keys:
+                del self.cached_queries[name]
+
+    def cache_info(self):
+        """returns the statistics of the answer cache"""
+        return CacheInfo(self.cache_hits, self.cache_misses, self.cache_size, len(self.answer_cache))
+
+    def cache_clear(self):
+        """empties the answer cache and resets its statistics"""
+        self.answer_cache.clear()
+        self.cached_queries.clear()
+        self.cache_hits = self.cache_misses = 0
+
+    def enable_profiling(self):
+        """starts collecting per-predicate statistics of the proofs; returns the Profiler"""
+        self.profiler = Profiler()
+        return self.profiler
+
+    def disable_profiling(self):
+        """stops profiling; returns the Profiler with the statistics collected"""
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
     def prove(self, ans, ans_body, indent=""):
         """enumerates the proofs for ans_body
         ans_body is a list of atoms to be proved
         ans is the list of values of the query variables
+        The search is depth-first as with recursive calls, but it keeps an explicit
+        stack of resolvent generators, so the depth of a proof is not limited
+        by the Python recursion limit.
         """
-        self.display(2,indent,f"(yes({ans}) <-"," & ".join(str(a) for a in ans_body))
-        if ans_body==[]:
-            yield ans
-        else:
-            selected, remaining = self.select_atom(ans_body)
-            if self.built_in(selected):
-                yield from self.eval_built_in(ans, selected, remaining, indent)
+        if self.profiler is not None:
+            yield from self.prove_profiled(ans, ans_body, indent)
+            return
+        stack = [iter([(ans, ans_body, indent)])]
+        while stack:
+            goal = next(stack[-1], None)
+            if goal is None:
+                stack.pop()
+                continue
+            ans, ans_body, indent = goal
+            if self.max_display_level >= 2:
+                self.display(2,indent,f"(yes({ans}) <-"," & ".join(str(a) for a in ans_body))
+            if ans_body==[]:
+                yield ans
+            else:
+                stack.append(self.resolvents(ans, ans_body, indent))
+
+    def prove_profiled(self, ans, ans_body, indent=""):
+        """prove, collecting statistics in self.profiler.
+        The time spent in each resolvent generator is charged to the predicate
+        of its selected atom."""
+        profiler = self.profiler
+        stack = [(iter([(ans, ans_body, indent)]), None)]
+        while stack:
+            frame, stats = stack[-1]
+            start = perf_counter()
+            goal = next(frame, None)
+            if stats is not None:
+                stats['time'] += perf_counter() - start
+            if goal is None:
+                stack.pop()
+                continue
+            ans, ans_body, indent = goal
+            if self.max_display_level >= 2:
+                self.display(2,indent,f"(yes({ans}) <-"," & ".join(str(a) for a in ans_body))
+            if ans_body==[]:
+                yield ans
             else:
-                for chosen_clause in self.atom_to_clauses[selected.name]:
-                    clause = chosen_clause.rename()  # rename variables
+                start = perf_counter()
+                selected, remaining = self.select_atom(ans_body)
+                if selected.name == EXIT:
+                    stats = profiler.entry(selected.args[0])
+                    stats['answers'] += 1
+                    stack.append((iter([(ans, remaining, indent)]), None))
+                else:
+                    stats = profiler.entry(selected.name)
+                    stats['calls'] += 1
+                    stats['time'] += perf_counter() - start
+                    stack.append((self.resolvents(ans, ans_body, indent, selected, remaining), stats))
+
+    def resolvents(self, ans, ans_body, indent, selected=None, remaining=None):
+        """generates the (ans, ans_body, indent) goals that result from resolving
+        the selected atom of ans_body (chosen by select_atom unless given).
+        While profiling, an exit marker follows the body of each resolved clause."""
+        if selected is None:
+            selected, remaining = self.select_atom(ans_body)
+        stats = self.profiler.entry(selected.name) if self.profiler is not None else None
+        if self.built_in(selected):
+            for goal in self.eval_built_in(ans, selected, remaining, indent):
+                if stats is not None:
+                    stats['answers'] += 1
+                yield goal
+        else:
+            exit_marker = [Atom(EXIT,[selected.name])] if stats is not None else []
+            for chosen_clause in self.clauses_for(selected, remaining):
+                clause = chosen_clause.rename()  # rename variables
+                sub = None
+                if not clause.body and not clause.logical_variables:  # ground fact
+                    sub = match_fact(selected.args, clause.head.args)
+                if sub is None:
                     sub = unify(selected, clause.head)
-                    if sub is not False:
-                        self.display(3,indent,"KB.prove: selected=", selected, "clause=",clause,"sub=",sub) 
-                        resans = apply(ans,sub)
+                if stats is not None:
+                    stats['clause_tries'] += 1
+                if sub is not False:
+                    self.display(3,indent,"KB.prove: selected=", selected, "clause=",clause,"sub=",sub)
+                    resans = apply(ans,sub)
+                    if stats is not None:
+                        stats['unifications'] += 1
+                        new_ans_body = apply(clause.body+exit_marker+remaining, sub)
+                    else:
                         new_ans_body = apply(clause.body+remaining, sub)
-                        yield from self.prove(resans, new_ans_body, indent+"    ")
+                    yield resans, new_ans_body, indent+"    "
 
     def select_atom(self,lst):
         """given list of atoms, return (selected atom, remaining atoms)
+        when plan_queries is true, a built-in is selected as soon as its arguments are
+        ground and an atom with at most one matching clause is selected immediately;
+        otherwise the atom with the smallest estimate is selected.
+        Aggregates are selected after the other atoms, so the variables their goal
+        shares with the rest of the body act as group-by keys.
+        Bodies with function symbols (e.g., lists) keep the left-to-right order,
+        as reordering them can change termination.
+        The first atom is selected without estimating the others when it is a ground
+        built-in or matches at most one clause (the common case once a rule is called
+        with constant arguments); otherwise the choice is cached per bound-argument
+        pattern of the body (plan_cache), so the atoms are estimated once per pattern
+        rather than at each step. Adding or removing a clause clears the cache.
+        While profiling, exit markers are barriers: only the atoms before the
+        first marker can be selected.
         """
-        return lst[0],lst[1:]
+        end = len(lst)
+        if self.profiler is not None:
+            for i,atom in enumerate(lst):
+                if atom.name == EXIT:
+                    end = i
+                    break
+        if not self.plan_queries or end <= 1:
+            return lst[0],lst[1:]
+        first = lst[0]
+        if first.name not in BUILT_INS:
+            if self.at_most_one(first):
+                return first,lst[1:]
+        elif first.name not in AGGREGATES and not any(isinstance(a,Var) for a in first.args):
+            return first,lst[1:]
+        key = plan_key(lst, end)
+        if key is None:
+            return lst[0],lst[1:]
+        best = self.plan_cache.get(key)
+        if best is None:
+            best = self.plan_atom(lst, end)
+            if len(self.plan_cache) >= self.plan_cache_size:
+                self.plan_cache.clear()
+            self.plan_cache[key] = best
+        return lst[best],lst[:best]+lst[best+1:]
+
+    def plan_atom(self, lst, end):
+        """returns the position of the atom to select among the first end atoms of lst.
+        The choice only depends on the bound-argument pattern of lst (see plan_key),
+        so select_atom reuses it for bodies with the same pattern."""
+        best, best_cost, aggregate = None, None, None
+        for i in range(end):
+            atom = lst[i]
+            if atom.name in AGGREGATES:
+                if aggregate is None:
+                    aggregate = i
+                continue
+            if self.built_in(atom):
+                if not any(isinstance(a,Var) for a in atom.args):
+                    best = i
+                    break
+            else:
+                cost = self.estimate(atom, lst)
+                if cost <= 1:
+                    best = i
+                    break
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = i, cost
+        if best is None:
+            best = aggregate if aggregate is not None else 0
+        return best
 
     def built_in(self,atom):
-        return atom.name in ['lt','triple']
+        return atom.name in BUILT_INS
 
     def eval_built_in(self,ans, selected, remaining, indent):
+        """generates the goals that result from evaluating built-in selected"""
         if selected.name == 'lt':  # less than
             [a1,a2] = selected.args
             if a1 < a2:
-                yield from self.prove(ans, remaining, indent+"    ")
+                yield ans, remaining, indent+"    "
+        if selected.name == 'le':  # less than or equal
+            [a1,a2] = selected.args
+            if a1 <= a2:
+                yield ans, remaining, indent+"    "
+        if selected.name == 'between':  # between(Low, High, X) means Low <= X <= High
+            [low,high,x] = selected.args
+            if low <= x <= high:
+                yield ans, remaining, indent+"    "
         if selected.name == 'triple':    # use triple store (AIFCA Ch 16)
-            yield from self.eval_triple(ans, selected, remaining, indent)
+            for proof in self.eval_triple(ans, selected, remaining, indent):
+                yield proof, [], indent
+        if selected.name in AGGREGATES:
+            yield from self.eval_aggregate(ans, selected, remaining, indent)
+
+    def solutions(self, goal, indent=""):
+        """returns (gvars, generator of the distinct tuples of values of gvars that prove goal)"""
+        gvars = list(log_vars(goal, set()))
+        def distinct():
+            seen = set()
+            for sol in self.prove(gvars, goal, indent):
+                key = term_key(sol)
+                if key not in seen:
+                    seen.add(key)
+                    yield sol
+        return gvars, distinct()
+
+    def eval_aggregate(self, ans, selected, remaining, indent):
+        """generates the goals that result from evaluating aggregate selected.
+        The unbound variables of the goal that also occur outside the aggregate
+        (in the query or in the rest of the body) are group-by keys: there is one
+        answer for each of their values, with the aggregate of that group (groups
+        with no solutions have no answer). The other variables of the goal are local
+        to the aggregate; each distinct binding of them is a solution (set semantics).
+        top_k(N,Score,Goal) proves Goal for its N solutions with the highest Score,
+        best first, keeping only N solutions in a heap; it binds all the variables
+        of Goal, so it has no group-by keys."""
+        goal = aggregate_goal(selected)
+        gvars, sols = self.solutions(goal, indent+"    ")
+        var = None
+        if selected.name != 'count':
+            var = selected.args[1] if selected.name == 'top_k' else selected.args[0]
+            if var not in gvars:
+                raise ValueError(f"{selected}: {var} must be an unbound variable of the goal")
+            pos = gvars.index(var)
+        if selected.name == 'top_k':
+            n = selected.args[0]
+            for sol in nlargest(n, sols, key=lambda sol: sol[pos]):
+                sub = dict(zip(gvars,sol))
+                yield apply(ans,sub), apply(remaining,sub), indent+"    "
+            return
+        outside = log_vars([ans, remaining], set())
+        keys = [i for i,v in enumerate(gvars) if v in outside and v != var]
+        groups = {}   # term_key of the key values -> (key values, list of solutions)
+        for sol in sols:
+            key = [sol[i] for i in keys]
+            groups.setdefault(term_key(key), (key, []))[1].append(sol)
+        if not keys and not groups:
+            groups[()] = ([], [])   # the aggregate of no solutions
+        for key, group in groups.values():
+            if selected.name == 'count':
+                value = len(group)
+            else:
+                values = (sol[pos] for sol in group)
+                if selected.name == 'sum':
+                    value = sum(values)
+                else:
+                    value = (min if selected.name == 'min' else max)(values, default=None)
+                    if value is None:
+                        continue
+            keysub = {gvars[i]: val for i,val in zip(keys, key)}
+            sub = unify(apply(selected.args[-1], keysub), value)
+            if sub is not False:
+                yield (apply(apply(ans,keysub),sub), apply(apply(remaining,keysub),sub),
+                       indent+"    ")
 
 A = Var('A')
 F = Var('F')
@@ -0,0 +1,201 @@
+import json
+import os
+import struct
+import numpy as np
+import pandas as pd
+from src.data.dataset_cache import CACHE_DIR, cache_path, source_key, is_current
+from src.knowledge.kb_snapshot import file_digest
+
+# Intestazione: firma, versione del formato, lunghezza del JSON che descrive le sezioni
+MAGIC = b'ATTRSTOR'
+STORE_VERSION = 1
+HEADER = struct.Struct('<8sII')
+
+# Allineamento delle sezioni nel file (byte)
+ALIGNMENT = 64
+
+# Colonne numeriche del catalogo e tipo con cui sono memorizzate
+NUMERIC_COLUMNS = {
+    'id_attrazione': '<i4',
+    'latitudine': '<f8',
+    'longitudine': '<f8',
+    'recensione_media': '<f8',
+    'costo': '<f8',
+    'tempo_visita': '<i4',
+}
+# Colonna categorica, memorizzata come codice int16 (-1 = mancante) più l'elenco delle categorie
+CATEGORY_COLUMN = 'categoria'
+# Colonne di testo, memorizzate in un heap UTF-8 con una tabella di offset (n + 1 valori)
+TEXT_COLUMNS = ('nome', 'descrizione')
+
+# Ordine delle colonne nel DataFrame ricostruito (quello del dataset)
+COLUMN_ORDER = ['id_attrazione', 'nome', 'categoria', 'latitudine', 'longitudine', 'recensione_media',
+                'costo', 'tempo_visita', 'descrizione']
+
+
+def store_path(file_path, cache_dir=None):
+    """Percorso del file binario del catalogo ricavato da un CSV"""
+    return os.path.splitext(cache_path(file_path, cache_dir or CACHE_DIR))[0] + '.attr'
+
+
+def _text_sections(values):
+    """Restituisce (offset uint64, heap UTF-8) per una colonna di testo"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def write_store(df, path, source=None):
+    """
+    Scrive il catalogo delle attrazioni in formato struct-of-arrays in modo atomico
+
+    Args:
+        df: DataFrame delle attrazioni
+        path: percorso del file da scrivere
+        source: dizionario che identifica il CSV di origine (per il controllo di validità)
+    """
+    sections = {}
+    for column, dtype in NUMERIC_COLUMNS.items():
+        sections[column] = df[column].to_numpy().astype(dtype)
+    codes, categories = pd.factorize(df[CATEGORY_COLUMN])
+    sections[CATEGORY_COLUMN] = codes.astype('<i2')
+    for column in TEXT_COLUMNS:
+        values = df[column].fillna('').astype(str).tolist()
+        sections[f'{column}.offsets'], sections[f'{column}.heap'] = _text_sections(values)
+
+    # Posizione di ogni sezione: calcolata sulla lunghezza dell'intestazione, che dipende
+    # a sua volta dalle posizioni; si ripete finché la lunghezza non si stabilizza
+    layout = {}
+    header_size = 0
+    while True:
+        offset = HEADER.size + header_size
+        for name, array in sections.items():
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            layout[name] = [offset, array.dtype.str, len(array)]
+            offset += array.nbytes
+        meta = json.dumps({'rows': len(df), 'categories': list(categories), 'sections': layout,
+                           'source': source}).encode('utf-8')
+        if len(meta) == header_size:
+            break
+        header_size = len(meta)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, STORE_VERSION, len(meta)))
+        f.write(meta)
+        for name, array in sections.items():
+            f.seek(layout[name][0])
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+
+class AttractionStore:
+    """
+    Catalogo delle attrazioni mappato in memoria in sola lettura.
+
+    Le colonne numeriche sono viste NumPy sul file, per cui più processi che aprono lo
+    stesso file condividono le pagine del sistema operativo invece di avere ciascuno una
+    copia dei dati; nomi e descrizioni sono decodificati dall'heap solo quando servono.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, meta_size = HEADER.unpack(self._map[:HEADER.size].tobytes())
+        if magic != MAGIC or version != STORE_VERSION:
+            raise ValueError(f"{path} non è un catalogo di attrazioni valido (versione {STORE_VERSION})")
+        meta = json.loads(self._map[HEADER.size:HEADER.size + meta_size].tobytes().decode('utf-8'))
+        self.rows = meta['rows']
+        self.categories = meta['categories']
+        self.source = meta['source']
+        self.sections = meta['sections']
+        self.columns = self._sections(self._map)
+
+    def _sections(self, mapping):
+        """Sezioni del file come array NumPy sulla mappa indicata (senza copia)"""
+        return {name: np.frombuffer(mapping, dtype=dtype, count=length, offset=offset)
+                for name, (offset, dtype, length) in self.sections.items()}
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, column):
+        """Colonna numerica (vista sul file) o codici della categoria"""
+        return self.columns[column]
+
+    def text(self, column, position):
+        """Valore della colonna di testo per la riga in position"""
+        offsets = self.columns[f'{column}.offsets']
+        start, end = int(offsets[position]), int(offsets[position + 1])
+        return self.columns[f'{column}.heap'][start:end].tobytes().decode('utf-8')
+
+    def texts(self, column):
+        """Tutti i valori di una colonna di testo"""
+        offsets = self.columns[f'{column}.offsets'].tolist()
+        data = self.columns[f'{column}.heap'].tobytes()
+        return [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+    def category(self, position):
+        code = int(self.columns[CATEGORY_COLUMN][position])
+        return self.categories[code] if code >= 0 else None
+
+    def record(self, position):
+        """Riga in position come dizionario (stesse chiavi del dataset)"""
+        record = {column: self.columns[column][position].item() for column in NUMERIC_COLUMNS}
+        record[CATEGORY_COLUMN] = self.category(position)
+        for column in TEXT_COLUMNS:
+            record[column] = self.text(column, position)
+        return {column: record[column] for column in COLUMN_ORDER}
+
+    def to_dataframe(self, columns=None):
+        """
+        DataFrame delle attrazioni. Le colonne numeriche sono viste su una mappa privata del file
+        (copy-on-write): condividono le pagine con gli altri processi finché non vengono modificate
+        e le modifiche non raggiungono né il file né il catalogo. La categoria è categorica
+        (codici copiati) e i testi sono decodificati dall'heap solo se richiesti.
+
+        Args:
+            columns: colonne da includere, nell'ordine del dataset (default tutte)
+        """
+        unknown = set(columns or ()) - set(COLUMN_ORDER)
+        if unknown:
+            raise ValueError(f"Colonne sconosciute: {sorted(unknown)}")
+        selected = COLUMN_ORDER if columns is None else [column for column in COLUMN_ORDER if column in columns]
+        private = None
+        if any(column in NUMERIC_COLUMNS for column in selected):
+            private = self._sections(np.memmap(self.path, dtype=np.uint8, mode='c'))
+        data = {}
+        for column in selected:
+            if column in NUMERIC_COLUMNS:
+                data[column] = pd.Series(private[column], copy=False)
+            elif column == CATEGORY_COLUMN:
+                data[column] = pd.Categorical.from_codes(self.columns[column], self.categories)
+            else:
+                data[column] = pd.Series(self.texts(column), dtype='str')
+        return pd.DataFrame(data, columns=selected, copy=False)
+
+
+def is_fresh(store, file_path):
+    """True se il catalogo è stato costruito dal contenuto attuale di file_path"""
+    return is_current(store.source, file_path)
+
+
+def open_store(file_path, cache_dir=None):
+    """
+    Apre il catalogo binario ricavato da file_path, ricostruendolo dal CSV se manca o se il
+    CSV è cambiato (stessi criteri di validità della cache colonnare)
+    """
+    path = store_path(file_path, cache_dir)
+    if os.path.exists(path):
+        try:
+            store = AttractionStore(path)
+            if is_fresh(store, file_path):
+                return store
+        except (ValueError, OSError) as e:
+            print(f"Catalogo {path} non leggibile, verrà ricostruito: {e}")
+    source = dict(source_key(file_path), digest=file_digest(file_path))
+    write_store(pd.read_csv(file_path), path, source)
+    return AttractionStore(path)
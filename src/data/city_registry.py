@@ -0,0 +1,192 @@
+import threading
+from collections import OrderedDict
+from src.data.data_context import DataContext
+from src.data.data_manager import ATTRACTIONS_CSV_PATH, TOURISTS_CSV_PATH
+from src.knowledge.reasoning_module import DatalogReasoner
+
+# Budget di memoria predefinito per i dati caricati di tutte le città (byte)
+DEFAULT_MEMORY_BUDGET = 1 << 30
+
+# Stima della memoria per fatto o tupla derivata della KB a clausole (clausola, indici e viste)
+KB_TUPLE_BYTES = 320
+
+# Città servita dal registro predefinito
+DEFAULT_CITY = 'roma'
+
+# Registro condiviso dal processo (creato al primo uso)
+_DEFAULT_REGISTRY = None
+
+
+def frame_bytes(df):
+    """Memoria occupata da un DataFrame (0 se None)"""
+    return int(df.memory_usage(deep=True).sum()) if df is not None else 0
+
+
+def reasoner_bytes(reasoner):
+    """
+    Stima della memoria di un reasoner esclusi i DataFrame del contesto: esatta per le
+    relazioni dello store colonnare, proporzionale a fatti e tuple derivate per la KB
+    """
+    if reasoner.store == 'columnar':
+        return sum(frame_bytes(relation) for relation in reasoner.kb.relations.values())
+    tuples = sum(len(clauses) for clauses in reasoner.kb.atom_to_clauses.values())
+    if reasoner.views is not None:
+        tuples += sum(len(relation) for relation in reasoner.views.relations.values())
+    return tuples * KB_TUPLE_BYTES
+
+
+class CityData:
+    """Dati di una città caricata: contesto (DataFrame e indici derivati) e reasoner"""
+
+    def __init__(self, context):
+        self.context = context
+        self.reasoner = None
+        self.memory = 0  # byte stimati, aggiornati dal registro
+
+    def measure(self):
+        self.memory = frame_bytes(self.context.attractions) + frame_bytes(self.context.tourists)
+        if self.reasoner is not None:
+            self.memory += reasoner_bytes(self.reasoner)
+        return self.memory
+
+
+class CityRegistry:
+    """
+    Registro dei dataset per città.
+
+    Ogni città è caricata al primo accesso (contesto dati e, su richiesta, reasoner con i
+    suoi indici) e resta in memoria finché il totale stimato non supera il budget: a quel
+    punto vengono scaricate le città usate meno di recente. Una città scaricata viene
+    ricaricata in modo trasparente alla richiesta successiva (il reasoner dallo snapshot).
+
+    Il registro è thread-safe: un unico lock rientrante protegge le città caricate, per
+    cui publish() può essere chiamato dal thread del ricaricamento a caldo mentre altri
+    thread servono richieste. Caricamenti e costruzioni dei reasoner avvengono sotto il
+    lock, così due thread non costruiscono la stessa città.
+    """
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, store='kb', use_cache=True, use_snapshot=True,
+                 snapshot_dir=None):
+        """
+        memory_budget: byte disponibili per i dati di tutte le città (None = nessun limite)
+        store: tipo di store dei reasoner ('kb' o 'columnar')
+        use_cache: se usare la cache colonnare dei CSV
+        use_snapshot: se caricare i reasoner dagli snapshot su disco
+        snapshot_dir: directory degli snapshot (default datasets/.cache)
+        """
+        self.memory_budget = memory_budget
+        self.store = store
+        self.use_cache = use_cache
+        self.use_snapshot = use_snapshot
+        self.snapshot_dir = snapshot_dir
+        self.sources = {}  # città -> (CSV attrazioni, CSV turisti)
+        self._loaded = OrderedDict()  # città -> CityData, dalla meno alla più recente
+        self.evictions = 0
+        self._lock = threading.RLock()
+
+    def register(self, city, attractions_path, tourists_path=None):
+        """Registra (o aggiorna) i file di una città; se era caricata viene scaricata"""
+        with self._lock:
+            self.sources[city] = (attractions_path, tourists_path or TOURISTS_CSV_PATH)
+            self.evict(city)
+
+    def cities(self):
+        """Città registrate"""
+        with self._lock:
+            return list(self.sources)
+
+    def loaded_cities(self):
+        """Città caricate, dalla usata meno di recente alla più recente"""
+        with self._lock:
+            return list(self._loaded)
+
+    def context(self, city):
+        """DataContext della città (caricato al primo accesso)"""
+        with self._lock:
+            return self._city(city).context
+
+    def reasoner(self, city):
+        """Reasoner della città (costruito o letto dallo snapshot al primo accesso)"""
+        with self._lock:
+            data = self._city(city)
+            if data.reasoner is None:
+                data.reasoner = DatalogReasoner.load(store=self.store, use_snapshot=self.use_snapshot,
+                                                     snapshot_dir=self.snapshot_dir, context=data.context,
+                                                     name=self.snapshot_name(city))
+                data.measure()
+                self._enforce_budget(city)
+            return data.reasoner
+
+    def snapshot_name(self, city):
+        """Nome dello snapshot su disco del reasoner della città"""
+        # La città predefinita condivide lo snapshot del sistema a città singola
+        return f"reasoner_{self.store}" if city == DEFAULT_CITY else f"reasoner_{self.store}_{city}"
+
+    def publish(self, city, context, reasoner):
+        """
+        Sostituisce i dati caricati della città con una nuova versione (es. dopo un
+        ricaricamento a caldo), così le richieste successive al registro non vedono i vecchi;
+        può essere chiamato da qualsiasi thread
+        """
+        data = CityData(context)
+        data.reasoner = reasoner
+        data.measure()
+        with self._lock:
+            if city not in self.sources:
+                raise ValueError(f"Città non registrata: {city}")
+            self._loaded[city] = data
+            self._loaded.move_to_end(city)
+            self._enforce_budget(city)
+
+    def evict(self, city):
+        """Scarica i dati di una città (restituisce True se era caricata)"""
+        with self._lock:
+            if self._loaded.pop(city, None) is None:
+                return False
+            self.evictions += 1
+            return True
+
+    def memory_usage(self):
+        """Memoria stimata per città caricata (byte)"""
+        with self._lock:
+            return {city: data.memory for city, data in self._loaded.items()}
+
+    def _city(self, city):
+        # Chiamato con self._lock acquisito
+        data = self._loaded.get(city)
+        if data is not None:
+            self._loaded.move_to_end(city)
+            return data
+        if city not in self.sources:
+            raise ValueError(f"Città non registrata: {city}")
+
+        attractions_path, tourists_path = self.sources[city]
+        print(f"Caricamento dataset della città {city}...")
+        data = CityData(DataContext(attractions_path, tourists_path, use_cache=self.use_cache))
+        data.measure()
+        self._loaded[city] = data
+        self._enforce_budget(city)
+        return data
+
+    def _enforce_budget(self, keep):
+        """Scarica le città meno recenti finché la memoria stimata rientra nel budget (keep resta)"""
+        if self.memory_budget is None:
+            return
+        total = sum(data.memory for data in self._loaded.values())
+        for city in list(self._loaded):
+            if total <= self.memory_budget:
+                break
+            if city == keep:
+                continue
+            total -= self._loaded[city].memory
+            self.evict(city)
+            print(f"Città {city} scaricata (budget di memoria)")
+
+
+def default_registry():
+    """Restituisce il registro condiviso dal processo, con Roma registrata"""
+    global _DEFAULT_REGISTRY
+    if _DEFAULT_REGISTRY is None:
+        _DEFAULT_REGISTRY = CityRegistry()
+        _DEFAULT_REGISTRY.register(DEFAULT_CITY, ATTRACTIONS_CSV_PATH, TOURISTS_CSV_PATH)
+    return _DEFAULT_REGISTRY
@@ -0,0 +1,106 @@
+from src.data.data_manager import load_attractions, load_tourists, get_tourist_profile, ATTRACTIONS_CSV_PATH, \
+    TOURISTS_CSV_PATH
+
+# Contesto condiviso dal processo (creato al primo uso)
+_DEFAULT_CONTEXT = None
+
+
+class DataContext:
+    """
+    Proprietario dei dati caricati: catalogo delle attrazioni, profili dei turisti e
+    indici derivati. Ogni sorgente è letta al più una volta, al primo accesso; reasoner,
+    pianificatore e MDP ricevono lo stesso contesto invece di ricaricare i CSV.
+
+    refresh() scarta i dati letti e gli indici derivati: gli accessi successivi rileggono
+    i file. Gli oggetti già costruiti mantengono i DataFrame che hanno ricevuto, per cui
+    un reasoner vede i nuovi dati solo se viene ricreato.
+    """
+
+    def __init__(self, attractions_path=None, tourists_path=None, use_cache=True):
+        """
+        attractions_path: percorso del CSV delle attrazioni (default quello del progetto)
+        tourists_path: percorso del CSV dei turisti (default quello del progetto)
+        use_cache: se False i CSV sono sempre analizzati, senza leggere né scrivere la cache colonnare
+        """
+        self.use_cache = use_cache
+        self.paths = {'attractions': attractions_path or ATTRACTIONS_CSV_PATH,
+                      'tourists': tourists_path or TOURISTS_CSV_PATH}
+        self._loaders = {'attractions': load_attractions, 'tourists': load_tourists}
+        self._frames = {}  # sorgente -> DataFrame (o None se il caricamento è fallito)
+        self._derived = {}  # nome -> indice derivato dai DataFrame
+        self._reads = {source: 0 for source in self.paths}  # sorgente -> letture dei file
+        self.version = 0  # incrementata a ogni refresh
+
+    def __getstate__(self):
+        # Gli indici derivati non sono serializzati (vengono ricostruiti al primo uso)
+        state = dict(self.__dict__)
+        state['_derived'] = {}
+        return state
+
+    @property
+    def attractions(self):
+        """DataFrame delle attrazioni (letto al primo accesso)"""
+        return self._frame('attractions')
+
+    @property
+    def tourists(self):
+        """DataFrame dei turisti (letto al primo accesso)"""
+        return self._frame('tourists')
+
+    @property
+    def reads(self):
+        """Numero di letture dei file per sorgente dalla creazione del contesto (copia in sola lettura)"""
+        return dict(self._reads)
+
+    def _frame(self, source):
+        if source not in self._frames:
+            self._reads[source] += 1
+            self._frames[source] = self._loaders[source](self.paths[source], use_cache=self.use_cache)
+        return self._frames[source]
+
+    def is_loaded(self, source):
+        """True se la sorgente ('attractions' o 'tourists') è già stata letta"""
+        return source in self._frames
+
+    def adopt(self, **frames):
+        """
+        Registra DataFrame già letti altrove (es. da uno snapshot) per le sorgenti non
+        ancora caricate, es. adopt(attractions=df); le sorgenti già caricate non cambiano
+        """
+        for source, frame in frames.items():
+            if source not in self.paths:
+                raise ValueError(f"Sorgente sconosciuta: {source}")
+            self._frames.setdefault(source, frame)
+
+    def derived(self, name, build):
+        """
+        Restituisce l'indice derivato name, costruendolo con build(self) al primo accesso;
+        gli indici sono scartati da refresh()
+        """
+        if name not in self._derived:
+            self._derived[name] = build(self)
+        return self._derived[name]
+
+    def refresh(self, *sources):
+        """
+        Scarta le sorgenti indicate (tutte se non ne viene indicata nessuna) e gli indici
+        derivati; la lettura successiva rilegge i file
+        """
+        for source in sources or list(self.paths):
+            if source not in self.paths:
+                raise ValueError(f"Sorgente sconosciuta: {source}")
+            self._frames.pop(source, None)
+        self._derived.clear()
+        self.version += 1
+
+    def tourist_profile(self, tourist_id):
+        """Restituisce il profilo di un turista come dizionario (o None se non esiste)"""
+        return get_tourist_profile(self.tourists, tourist_id)
+
+
+def default_context():
+    """Restituisce il contesto dati condiviso dal processo"""
+    global _DEFAULT_CONTEXT
+    if _DEFAULT_CONTEXT is None:
+        _DEFAULT_CONTEXT = DataContext()
+    return _DEFAULT_CONTEXT
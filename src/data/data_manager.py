@@ -1,6 +1,11 @@
+import numpy as np
 import pandas as pd
 import os
+import weakref
 from pathlib import Path
+from src.data.dataset_cache import load_cached_csv
+from src.data.attraction_store import open_store
+from src.data.sqlite_store import open_database
 
 # --- Utilizzo di percorsi relativi ---
 # Ottiene il percorso della directory corrente dello script
@@ -12,13 +17,15 @@ ATTRACTIONS_CSV_PATH = os.path.join(PROJECT_ROOT, 'datasets', 'attrazioni_roma.c
 TOURISTS_CSV_PATH = os.path.join(PROJECT_ROOT, 'datasets', 'preferenze_turista.csv')
 
 
-def load_csv_to_dataframe(file_path):
+def load_csv_to_dataframe(file_path, use_cache=True):
     """
     Carica un file CSV in un DataFrame pandas.
     Gestisce FileNotFoundError e altri errori in modo robusto.
 
     Args:
         file_path (str): Il percorso del file CSV.
+        use_cache (bool): Se True legge la cache colonnare in datasets/.cache quando è
+            aggiornata (e la ricostruisce altrimenti) invece di analizzare il testo.
 
     Returns:
         pandas.DataFrame or None: Il DataFrame caricato o None se il file non esiste.
@@ -37,8 +44,8 @@ def load_csv_to_dataframe(file_path):
                     print(f"  - {file}")
             return None
 
-        # Carica il file CSV
-        df = pd.read_csv(file_path)
+        # Carica il file CSV (dalla cache colonnare se aggiornata)
+        df = load_cached_csv(file_path) if use_cache else pd.read_csv(file_path)
         return df
     except pd.errors.EmptyDataError:
         print(f"Errore: Il file {file_path} è vuoto.")
@@ -51,12 +58,13 @@ def load_csv_to_dataframe(file_path):
         return None
 
 
-def load_attractions(file_path=None):
+def load_attractions(file_path=None, use_cache=True):
     """
     Carica il dataset delle attrazioni.
 
     Args:
         file_path (str, optional): Percorso personalizzato del CSV. Se None, usa il percorso predefinito.
+        use_cache (bool): Se True usa la cache colonnare del CSV.
 
     Returns:
         pandas.DataFrame or None: DataFrame delle attrazioni o None in caso di errore.
@@ -64,15 +72,16 @@ def load_attractions(file_path=None):
     print("Caricamento dati attrazioni...")
     if file_path is None:
         file_path = ATTRACTIONS_CSV_PATH
-    return load_csv_to_dataframe(file_path)
+    return load_csv_to_dataframe(file_path, use_cache)
 
 
-def load_tourists(file_path=None):
+def load_tourists(file_path=None, use_cache=True):
     """
     Carica il dataset delle preferenze dei turisti.
 
     Args:
         file_path (str, optional): Percorso personalizzato del CSV. Se None, usa il percorso predefinito.
+        use_cache (bool): Se True usa la cache colonnare del CSV.
 
     Returns:
         pandas.DataFrame or None: DataFrame dei turisti o None in caso di errore.
@@ -80,7 +89,159 @@ def load_tourists(file_path=None):
     print("Caricamento dati turisti...")
     if file_path is None:
         file_path = TOURISTS_CSV_PATH
-    return load_csv_to_dataframe(file_path)
+    return load_csv_to_dataframe(file_path, use_cache)
+
+
+class IdIndex:
+    """
+    Indice ID -> posizione della prima riga con quell'ID in un DataFrame.
+    Le ricerche usano un pd.Index degli ID distinti invece di una maschera sull'intera colonna.
+    """
+
+    def __init__(self, df, id_column):
+        self._build(df[id_column].to_numpy())
+
+    @classmethod
+    def from_ids(cls, ids):
+        """Costruisce l'indice dalla colonna degli ID (array nell'ordine delle righe)"""
+        index = cls.__new__(cls)
+        index._build(np.asarray(ids))
+        return index
+
+    def _build(self, ids):
+        distinct, first = np.unique(ids, return_index=True)
+        self.ids = pd.Index(distinct)
+        self.first = first  # posizione della prima riga per ogni ID distinto
+        self.rows = len(ids)
+
+    def position(self, numeric_id):
+        """Posizione della riga con l'ID indicato, o None se non esiste"""
+        try:
+            return int(self.first[self.ids.get_loc(numeric_id)])
+        except KeyError:
+            return None
+
+    def positions(self, numeric_ids):
+        """Posizioni delle righe con gli ID indicati (array, -1 per gli ID assenti)"""
+        found = self.ids.get_indexer(numeric_ids)
+        if not len(self.first):
+            return found
+        return np.where(found >= 0, self.first[found], -1)
+
+
+# Indici per ID costruiti una sola volta per DataFrame: (id(df), colonna) -> (riferimento debole, IdIndex)
+_ID_INDEXES = {}
+
+
+def id_index(df, id_column):
+    """
+    Restituisce l'indice per ID di df sulla colonna indicata, costruendolo al primo uso.
+    Un indice con un numero di righe diverso da df è ricostruito; le ricerche con id_position e
+    id_positions verificano inoltre le righe trovate, per cui anche un riordinamento sul posto
+    (es. sort_values(inplace=True)) ricostruisce l'indice. Dopo altre modifiche alla colonna
+    degli ID che non cambiano il numero di righe va chiamato invalidate_index(df).
+    """
+    key = (id(df), id_column)
+    entry = _ID_INDEXES.get(key)
+    if entry is not None and entry[0]() is df and entry[1].rows == len(df):
+        return entry[1]
+    return register_index(df, id_column, IdIndex(df, id_column))
+
+
+def register_index(df, id_column, index):
+    """Associa a df un indice per ID già costruito (es. durante il caricamento a blocchi)"""
+    key = (id(df), id_column)
+    _ID_INDEXES[key] = (weakref.ref(df, lambda _, key=key: _ID_INDEXES.pop(key, None)), index)
+    return index
+
+
+def id_position(df, id_column, numeric_id):
+    """
+    Posizione della riga di df con l'ID indicato, o None se non esiste.
+    L'ID della riga trovata è confrontato con quello cercato (controllo O(1)): se differisce
+    le righe sono state spostate dopo la costruzione e l'indice viene ricostruito.
+    """
+    position = id_index(df, id_column).position(numeric_id)
+    if position is not None and df[id_column].iat[position] != numeric_id:
+        position = register_index(df, id_column, IdIndex(df, id_column)).position(numeric_id)
+    return position
+
+
+def id_positions(df, id_column, numeric_ids):
+    """Come id_position per più ID (array, -1 per gli ID assenti), con un controllo vettoriale"""
+    positions = id_index(df, id_column).positions(numeric_ids)
+    found = positions >= 0
+    if found.any() and (df[id_column].to_numpy()[positions[found]] != np.asarray(numeric_ids)[found]).any():
+        positions = register_index(df, id_column, IdIndex(df, id_column)).positions(numeric_ids)
+    return positions
+
+
+def invalidate_index(df):
+    """Scarta gli indici per ID di df (da chiamare dopo aver modificato il DataFrame)"""
+    for key in [key for key in _ID_INDEXES if key[0] == id(df)]:
+        del _ID_INDEXES[key]
+
+
+def open_attraction_store(file_path=None, cache_dir=None):
+    """
+    Apre in sola lettura (mmap) il catalogo binario delle attrazioni, costruendolo dal CSV
+    se manca o è obsoleto. Più processi che aprono lo stesso catalogo ne condividono le pagine.
+
+    Args:
+        file_path (str, optional): Percorso del CSV di origine. Se None, usa il percorso predefinito.
+        cache_dir (str, optional): Directory del catalogo (default datasets/.cache).
+
+    Returns:
+        AttractionStore or None: Il catalogo o None se il CSV non esiste.
+    """
+    if file_path is None:
+        file_path = ATTRACTIONS_CSV_PATH
+    if not os.path.exists(file_path):
+        print(f"Errore: Il file {file_path} non esiste.")
+        return None
+    return open_store(file_path, cache_dir)
+
+
+def open_sqlite_store(attractions_path=None, tourists_path=None, cache_dir=None):
+    """
+    Apre in sola lettura il database SQLite di attrazioni e turisti (indici secondari e
+    R*Tree sulle coordinate), costruendolo dai CSV se manca o è obsoleto. Alternativa ai
+    DataFrame per cataloghi più grandi della memoria: le query leggono solo le righe necessarie.
+
+    Args:
+        attractions_path (str, optional): CSV delle attrazioni. Se None, usa il percorso predefinito.
+        tourists_path (str, optional): CSV dei turisti. Se None, usa il percorso predefinito.
+        cache_dir (str, optional): Directory del database (default datasets/.cache).
+
+    Returns:
+        SQLiteStore or None: Il database o None se un CSV non esiste.
+    """
+    attractions_path = attractions_path or ATTRACTIONS_CSV_PATH
+    tourists_path = tourists_path or TOURISTS_CSV_PATH
+    for file_path in (attractions_path, tourists_path):
+        if not os.path.exists(file_path):
+            print(f"Errore: Il file {file_path} non esiste.")
+            return None
+    return open_database(attractions_path, tourists_path, cache_dir)
+
+
+def load_attractions_mmap(file_path=None, cache_dir=None, columns=None):
+    """
+    Carica il dataset delle attrazioni dal catalogo binario mappato in memoria: stesso
+    risultato di load_attractions, ma le colonne numeriche condividono la memoria del file.
+
+    Args:
+        file_path (str, optional): Percorso del CSV di origine. Se None, usa il percorso predefinito.
+        cache_dir (str, optional): Directory del catalogo (default datasets/.cache).
+        columns (list, optional): Colonne da caricare (default tutte); i testi non richiesti
+            non vengono decodificati.
+
+    Returns:
+        pandas.DataFrame or None: DataFrame delle attrazioni o None in caso di errore.
+    """
+    print("Caricamento dati attrazioni (catalogo mappato in memoria)...")
+    store = open_attraction_store(file_path, cache_dir)
+    return store.to_dataframe(columns) if store is not None else None
 
 
 def get_attraction_details(attractions_df, attraction_id):
@@ -102,11 +263,11 @@ def get_attraction_details(attractions_df, attraction_id):
         # Converti l'ID in intero se è una stringa
         numeric_id = int(attraction_id)
 
-        # Cerca l'attrazione
-        attraction = attractions_df[attractions_df['id_attrazione'] == numeric_id]
+        # Cerca l'attrazione nell'indice per ID
+        position = id_position(attractions_df, 'id_attrazione', numeric_id)
 
-        if not attraction.empty:
-            return attraction.iloc[0].to_dict()
+        if position is not None:
+            return attractions_df.iloc[position].to_dict()
         else:
             print(f"Attenzione: Attrazione con ID {attraction_id} non trovata.")
             return None
@@ -124,6 +285,39 @@ def get_attraction_details(attractions_df, attraction_id):
         return None
 
 
+def get_attraction_details_many(attractions_df, attraction_ids):
+    """
+    Restituisce i dettagli di più attrazioni con un'unica ricerca vettoriale nell'indice per ID.
+
+    Args:
+        attractions_df (pandas.DataFrame): DataFrame delle attrazioni.
+        attraction_ids (iterable): ID delle attrazioni (int o str).
+
+    Returns:
+        list: Un dizionario per ogni ID, nello stesso ordine (None per gli ID non validi o assenti).
+    """
+    attraction_ids = list(attraction_ids)
+    if attractions_df is None:
+        print("Errore: DataFrame delle attrazioni non valido.")
+        return [None] * len(attraction_ids)
+
+    numeric_ids = []
+    for attraction_id in attraction_ids:
+        try:
+            numeric_ids.append(int(attraction_id))
+        except (TypeError, ValueError):
+            numeric_ids.append(None)
+    valid = [i for i, numeric_id in enumerate(numeric_ids) if numeric_id is not None]
+    positions = id_positions(attractions_df, 'id_attrazione', [numeric_ids[i] for i in valid])
+
+    results = [None] * len(attraction_ids)
+    found = positions >= 0
+    records = attractions_df.iloc[positions[found]].to_dict('records')
+    for i, record in zip(np.asarray(valid, dtype=int)[found].tolist(), records):
+        results[i] = record
+    return results
+
+
 def get_tourist_profile(tourists_df, tourist_id):
     """
     Restituisce il profilo di un specifico turista come dizionario.
@@ -143,11 +337,11 @@ def get_tourist_profile(tourists_df, tourist_id):
         # Converti l'ID in intero se è una stringa
         numeric_id = int(tourist_id)
 
-        # Cerca il turista
-        tourist = tourists_df[tourists_df['id_turista'] == numeric_id]
+        # Cerca il turista nell'indice per ID
+        position = id_position(tourists_df, 'id_turista', numeric_id)
 
-        if not tourist.empty:
-            return tourist.iloc[0].to_dict()
+        if position is not None:
+            return tourists_df.iloc[position].to_dict()
         else:
             print(f"Attenzione: Turista con ID {tourist_id} non trovato.")
             return None
@@ -187,6 +381,175 @@ def get_all_attractions_list(attractions_df):
         return []
 
 
+# --- Caricamento a blocchi per file di grandi dimensioni ---
+# Tipi compatti delle colonne (le colonne non elencate mantengono il tipo dedotto da pandas)
+ATTRACTION_DTYPES = {
+    'id_attrazione': 'int32',
+    'categoria': 'category',
+    'latitudine': 'float32',
+    'longitudine': 'float32',
+    'recensione_media': 'float32',
+    'costo': 'float32',
+    'tempo_visita': 'int32',
+}
+TOURIST_DTYPES = {
+    'id_turista': 'int32',
+    'arte': 'int8',
+    'storia': 'int8',
+    'natura': 'int8',
+    'divertimento': 'int8',
+    'tempo': 'int32',
+}
+
+# Intervalli ammessi per le colonne numeriche (estremi inclusi, None = illimitato)
+ATTRACTION_RANGES = {
+    'id_attrazione': (0, np.iinfo(np.int32).max),
+    'latitudine': (-90, 90),
+    'longitudine': (-180, 180),
+    'recensione_media': (0, 5),
+    'costo': (0, None),
+    'tempo_visita': (0, np.iinfo(np.int32).max),
+}
+TOURIST_RANGES = {
+    'id_turista': (0, np.iinfo(np.int32).max),
+    'arte': (0, 10),
+    'storia': (0, 10),
+    'natura': (0, 10),
+    'divertimento': (0, 10),
+    'tempo': (0, np.iinfo(np.int32).max),
+}
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def validate_chunk(chunk, dtypes, ranges):
+    """
+    Converte un blocco nei tipi compatti scartando le righe non valide.
+
+    Le colonne numeriche sono convertite con errors='coerce', per cui un valore non numerico
+    diventa mancante; sono scartate le righe con valori mancanti nelle colonne numeriche o
+    fuori dagli intervalli ammessi.
+
+    Args:
+        chunk (pandas.DataFrame): Blocco letto dal CSV.
+        dtypes (dict): Tipi compatti delle colonne.
+        ranges (dict): Intervalli ammessi (minimo, massimo) delle colonne numeriche.
+
+    Returns:
+        tuple: (blocco valido con i tipi compatti, numero di righe scartate).
+    """
+    missing = [column for column in dtypes if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Colonne mancanti nel CSV: {missing}")
+
+    valid = np.ones(len(chunk), dtype=bool)
+    for column, (low, high) in ranges.items():
+        values = pd.to_numeric(chunk[column], errors='coerce')
+        chunk[column] = values
+        valid &= values.notna().to_numpy()
+        if low is not None:
+            valid &= (values >= low).to_numpy()
+        if high is not None:
+            valid &= (values <= high).to_numpy()
+
+    rejected = int(len(chunk) - valid.sum())
+    if rejected:
+        chunk = chunk[valid]
+    return chunk.astype(dtypes), rejected
+
+
+def iter_csv_chunks(file_path, dtypes, ranges, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Legge un CSV a blocchi di chunk_size righe, restituendo ogni blocco già convalidato
+    e convertito nei tipi compatti; in memoria resta un solo blocco alla volta.
+
+    Yields:
+        tuple: (blocco valido, numero di righe scartate nel blocco).
+    """
+    with pd.read_csv(file_path, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield validate_chunk(chunk, dtypes, ranges)
+
+
+def _concat_chunks(chunks, dtypes):
+    """Concatena i blocchi mantenendo le colonne categoriche (categorie unite tra i blocchi)"""
+    if not chunks:
+        return None
+    df = pd.concat(chunks, ignore_index=True)
+    for column, dtype in dtypes.items():
+        if dtype == 'category' and df[column].dtype != 'category':
+            df[column] = pd.Categorical(df[column], categories=pd.api.types.union_categoricals(
+                [chunk[column] for chunk in chunks]).categories)
+    return df
+
+
+def load_attractions_chunked(file_path=None, chunk_size=DEFAULT_CHUNK_SIZE, consumers=(), retain=True):
+    """
+    Carica il dataset delle attrazioni a blocchi con tipi compatti (ID int32, coordinate e
+    valutazioni float32, categoria categorica) e convalida incrementale delle righe.
+    L'indice per ID è costruito durante la lettura e associato al DataFrame restituito.
+
+    Con retain=True i blocchi validi restano in memoria fino alla concatenazione finale:
+    il picco è circa il doppio del DataFrame compatto (blocchi più copia concatenata) più
+    il blocco in lettura. Con retain=False ogni blocco è passato ai consumer e poi scartato,
+    per cui la memoria resta limitata a un blocco indipendentemente dalla dimensione del file.
+
+    Args:
+        file_path (str, optional): Percorso del CSV. Se None, usa il percorso predefinito.
+        chunk_size (int): Numero di righe per blocco.
+        consumers (iterable): Funzioni chiamate con ogni blocco valido (es. costruttori di indici).
+        retain (bool): Se False non costruisce il DataFrame e restituisce solo il numero di righe valide.
+
+    Returns:
+        pandas.DataFrame or int or None: DataFrame compatto delle righe valide (numero di righe
+        valide con retain=False) o None se il file non esiste.
+    """
+    if file_path is None:
+        file_path = ATTRACTIONS_CSV_PATH
+    if not os.path.exists(file_path):
+        print(f"Errore: Il file {file_path} non esiste.")
+        return None
+
+    print("Caricamento a blocchi dati attrazioni...")
+    chunks = []
+    ids = []
+    rejected = 0
+    rows = 0
+    for chunk, chunk_rejected in iter_csv_chunks(file_path, ATTRACTION_DTYPES, ATTRACTION_RANGES, chunk_size):
+        rejected += chunk_rejected
+        rows += len(chunk)
+        if retain:
+            chunks.append(chunk)
+            ids.append(chunk['id_attrazione'].to_numpy())
+        for consumer in consumers:
+            consumer(chunk)
+    if rejected:
+        print(f"Attenzione: {rejected} righe non valide scartate da {file_path}")
+    if not retain:
+        return rows
+
+    df = _concat_chunks(chunks, ATTRACTION_DTYPES)
+    if df is not None:
+        register_index(df, 'id_attrazione', IdIndex.from_ids(np.concatenate(ids)))
+    return df
+
+
+def iter_tourists(file_path=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generatore dei profili dei turisti, letti a blocchi e convalidati, per i job batch
+    che elaborano un turista alla volta senza caricare l'intero file.
+
+    Yields:
+        dict: Profilo di un turista (stesse chiavi di get_tourist_profile).
+    """
+    if file_path is None:
+        file_path = TOURISTS_CSV_PATH
+    for chunk, rejected in iter_csv_chunks(file_path, TOURIST_DTYPES, TOURIST_RANGES, chunk_size):
+        if rejected:
+            print(f"Attenzione: {rejected} profili non validi scartati da {file_path}")
+        yield from chunk.to_dict('records')
+
+
 # --- Funzione per verificare l'accesso ai dati ---
 def check_data_access():
     """
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from src.knowledge.kb_snapshot import SNAPSHOT_DIR, file_digest
+
+# Le cache colonnari stanno accanto agli snapshot (directory ignorata da git)
+CACHE_DIR = SNAPSHOT_DIR
+
+# Da incrementare quando cambia il formato dei file di cache
+CACHE_VERSION = 1
+
+# Separatore dei valori di una colonna di testo serializzata come un'unica stringa UTF-8
+STRING_SEPARATOR = '\x00'
+
+
+def cache_path(file_path, cache_dir=None):
+    """Percorso del file di cache di un CSV (il nome include un hash del percorso assoluto)"""
+    source = os.path.abspath(file_path)
+    tag = hashlib.sha1(source.encode()).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(cache_dir or CACHE_DIR, f"{name}-{tag}.npz")
+
+
+def source_key(file_path):
+    """Percorso, dimensione e mtime del file sorgente (il contenuto è confrontato solo se serve)"""
+    stat = os.stat(file_path)
+    return {'path': os.path.abspath(file_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def is_current(source, file_path):
+    """
+    True se source (chiave registrata da source_key, con l'hash del contenuto) descrive il
+    contenuto attuale di file_path; se cambia solo l'mtime viene confrontato l'hash
+    """
+    source = source or {}
+    key = source_key(file_path)
+    if source.get('path') != key['path'] or source.get('size') != key['size']:
+        return False
+    return source.get('mtime_ns') == key['mtime_ns'] or source.get('digest') == file_digest(file_path)
+
+
+def _encode_column(series):
+    """
+    Restituisce gli array che rappresentano la colonna: i valori numerici così come sono,
+    il testo con codifica a dizionario (valori distinti come byte UTF-8 separati da
+    STRING_SEPARATOR e un codice per riga, -1 per i valori mancanti).
+    None se la colonna non è rappresentabile (la cache non viene scritta)
+    """
+    if series.dtype.kind in 'biuf':
+        return {'values': series.to_numpy()}
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    uniques = uniques.tolist()
+    if not all(isinstance(value, str) and STRING_SEPARATOR not in value for value in uniques):
+        return None
+    data = STRING_SEPARATOR.join(uniques).encode('utf-8')
+    return {'text': np.frombuffer(data, dtype=np.uint8), 'count': np.array(len(uniques)),
+            'codes': codes.astype(np.int32)}
+
+
+def _decode_column(arrays, prefix, dtype):
+    if f'{prefix}values' in arrays:
+        return arrays[f'{prefix}values']
+    text = arrays[f'{prefix}text'].tobytes().decode('utf-8')
+    uniques = text.split(STRING_SEPARATOR) if int(arrays[f'{prefix}count']) else []
+    # L'ultimo elemento corrisponde al codice -1 (valore mancante)
+    values = np.array(uniques + [None], dtype=object)[arrays[f'{prefix}codes']]
+    return pd.Series(values, dtype=dtype)
+
+
+def write_cache(df, file_path, key, cache_dir=None):
+    """
+    Scrive la cache colonnare di df (letto da file_path) in modo atomico
+
+    Returns:
+        Percorso del file scritto, o None se il DataFrame contiene colonne non rappresentabili
+    """
+    arrays = {}
+    columns = []
+    for i, column in enumerate(df.columns):
+        encoded = _encode_column(df[column])
+        if encoded is None:
+            return None
+        for name, array in encoded.items():
+            arrays[f'c{i}_{name}'] = array
+        columns.append([column, str(df[column].dtype)])
+    meta = dict(key, version=CACHE_VERSION, digest=file_digest(file_path), rows=len(df), columns=columns)
+    arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+    path = cache_path(file_path, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_cache(file_path, cache_dir=None):
+    """
+    Legge la cache colonnare di file_path se è aggiornata.
+
+    La cache è valida se percorso, dimensione e mtime coincidono con quelli registrati;
+    se cambia solo l'mtime viene confrontato l'hash del contenuto (un file solo "toccato"
+    non invalida la cache).
+
+    Returns:
+        Il DataFrame, o None se la cache manca, è obsoleta o illeggibile
+    """
+    path = cache_path(file_path, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+            key = source_key(file_path)
+            if meta['version'] != CACHE_VERSION or meta['path'] != key['path'] or meta['size'] != key['size']:
+                return None
+            if meta['mtime_ns'] != key['mtime_ns'] and meta['digest'] != file_digest(file_path):
+                return None
+            data = {column: _decode_column(arrays, f'c{i}_', dtype)
+                    for i, (column, dtype) in enumerate(meta['columns'])}
+    except Exception as e:
+        print(f"Cache {path} non leggibile, verrà ricostruita: {e}")
+        return None
+    return pd.DataFrame(data, columns=[column for column, _ in meta['columns']])
+
+
+def load_cached_csv(file_path, cache_dir=None):
+    """
+    Legge file_path dalla cache colonnare se è aggiornata, altrimenti analizza il CSV
+    e riscrive la cache. Gli errori di scrittura della cache non sono fatali.
+    """
+    df = read_cache(file_path, cache_dir)
+    if df is not None:
+        return df
+    key = source_key(file_path)
+    df = pd.read_csv(file_path)
+    try:
+        write_cache(df, file_path, key, cache_dir)
+    except OSError as e:
+        print(f"Impossibile scrivere la cache di {file_path}: {e}")
+    return df
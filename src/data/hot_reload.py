@@ -0,0 +1,230 @@
+import threading
+import time
+from src.data.data_context import DataContext, default_context
+from src.data.dataset_cache import source_key
+from src.knowledge.kb_snapshot import file_digest
+from src.knowledge.reasoning_module import DatalogReasoner
+
+# Intervallo predefinito tra due controlli dei file (secondi)
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+class CatalogueSnapshot:
+    """
+    Versione immutabile dei dati serviti: contesto, reasoner con i suoi indici e le cache
+    che ne dipendono (es. agenti addestrati). Una richiesta legge il riferimento allo
+    snapshot una sola volta e lo usa fino alla fine, per cui vede sempre dati coerenti
+    anche se nel frattempo ne viene pubblicato uno nuovo.
+    """
+
+    def __init__(self, version, context, reasoner, snapshot_name=None):
+        """
+        snapshot_name: nome dello snapshot su disco del reasoner (default reasoner_<store>),
+                       riusato dalle versioni successive; dataset diversi devono usare nomi diversi
+        """
+        self.version = version
+        self.context = context
+        self.reasoner = reasoner
+        self.snapshot_name = snapshot_name
+        self.caches = {}  # nome -> cache valida solo per questa versione dei dati
+        self.created_at = time.time()
+
+    @property
+    def attractions_df(self):
+        return self.reasoner.attractions_df
+
+    @property
+    def tourists_df(self):
+        return self.reasoner.tourists_df
+
+    def cache(self, name, build):
+        """Restituisce la cache name dello snapshot, creandola con build() al primo accesso"""
+        if name not in self.caches:
+            self.caches[name] = build()
+        return self.caches[name]
+
+
+class DatasetWatcher:
+    """
+    Controlla periodicamente se i file sorgente sono cambiati. Dimensione e mtime sono
+    confrontati a ogni controllo; l'hash del contenuto solo quando differiscono, così un
+    file solo "toccato" non provoca un ricaricamento (stesso criterio della cache colonnare).
+    """
+
+    def __init__(self, paths):
+        """paths: dizionario sorgente -> percorso del file"""
+        self.paths = dict(paths)
+        self._keys = {source: self._key(path) for source, path in self.paths.items()}
+
+    @staticmethod
+    def _key(path):
+        try:
+            return dict(source_key(path), digest=file_digest(path))
+        except OSError:
+            return None
+
+    def state(self):
+        """Stato attuale dei file (sorgente -> percorso, dimensione, mtime e hash)"""
+        return dict(self._keys)
+
+    def changed(self):
+        """
+        Sorgenti il cui contenuto è cambiato dall'ultimo controllo (lista vuota se nessuna);
+        lo stato registrato viene aggiornato
+        """
+        changed = []
+        for source, path in self.paths.items():
+            old = self._keys[source]
+            try:
+                key = source_key(path)
+            except OSError:
+                # File temporaneamente assente (es. durante una sostituzione): si riprova dopo
+                continue
+            if old is not None and key['size'] == old['size'] and key['mtime_ns'] == old['mtime_ns']:
+                continue
+            key['digest'] = file_digest(path)
+            self._keys[source] = key
+            if old is None or key['digest'] != old['digest']:
+                changed.append(source)
+        return changed
+
+
+class HotReloader:
+    """
+    Ricaricamento a caldo dei dataset.
+
+    Quando un CSV cambia, il nuovo snapshot (contesto, reasoner e indici vettoriali) è
+    costruito in un thread in background mentre quello precedente continua a servire le
+    richieste; a costruzione completata il riferimento allo snapshot corrente viene
+    sostituito in un'unica assegnazione. Le richieste in corso terminano sullo snapshot
+    che avevano letto. Ogni versione usa un DataContext nuovo: refresh() sul contesto
+    condiviso modificherebbe i dati sotto le richieste in corso.
+
+    Se il file cambia di nuovo durante la costruzione, o il nuovo catalogo non è leggibile,
+    lo snapshot costruito viene scartato e resta in servizio quello precedente.
+    """
+
+    def __init__(self, snapshot=None, store='kb', poll_interval=DEFAULT_POLL_INTERVAL, snapshot_dir=None,
+                 on_swap=None, use_snapshot=True):
+        """
+        snapshot: CatalogueSnapshot iniziale in servizio (default costruito sul contesto condiviso del processo)
+        store: tipo di store del reasoner iniziale, se viene costruito qui ('kb' o 'columnar')
+        poll_interval: secondi tra due controlli del thread di sorveglianza
+        snapshot_dir: directory degli snapshot del reasoner (default datasets/.cache)
+        on_swap: funzione chiamata con il nuovo snapshot dopo ogni sostituzione; è eseguita nel
+                 thread di costruzione, per cui deve essere thread-safe (es. CityRegistry.publish)
+        use_snapshot: se i reasoner sono caricati dagli snapshot su disco (e li aggiornano)
+                      o costruiti sempre in memoria
+        """
+        self.use_snapshot = use_snapshot
+        self.snapshot_dir = snapshot_dir
+        if snapshot is None:
+            context = default_context()
+            snapshot = CatalogueSnapshot(0, context, self._reasoner(store, context))
+        self.store = snapshot.reasoner.store
+        self.poll_interval = poll_interval
+        self.on_swap = on_swap
+        self.watcher = DatasetWatcher(snapshot.context.paths)
+        self._current = snapshot
+        self._lock = threading.Lock()
+        self._builder = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.reloads = 0
+        self.failures = 0
+
+    @property
+    def current(self):
+        """Snapshot in servizio (una richiesta dovrebbe leggerlo una sola volta)"""
+        return self._current
+
+    def check(self):
+        """
+        Controlla i file e, se sono cambiati, avvia la costruzione del nuovo snapshot in
+        background (True se è stata avviata)
+        """
+        with self._lock:
+            if self._builder is not None and self._builder.is_alive():
+                return False
+            if not self.watcher.changed():
+                return False
+            self._builder = threading.Thread(target=self._rebuild, args=(self.watcher.state(),), daemon=True)
+            self._builder.start()
+            return True
+
+    def wait(self, timeout=None):
+        """Attende la fine della costruzione in corso (True se non ce n'è nessuna in corso)"""
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+            return not builder.is_alive()
+        return True
+
+    def reload(self):
+        """Controlla i file e attende l'eventuale nuovo snapshot; restituisce lo snapshot corrente"""
+        if self.check():
+            self.wait()
+        return self._current
+
+    def _build(self, old):
+        context = DataContext(old.context.paths['attractions'], old.context.paths['tourists'],
+                              use_cache=old.context.use_cache)
+        if context.attractions is None or context.tourists is None:
+            raise ValueError("catalogo non leggibile")
+        reasoner = self._reasoner(self.store, context, old.snapshot_name)
+        # Indici vettoriali costruiti ora, non alla prima richiesta servita
+        reasoner.arrays
+        return CatalogueSnapshot(old.version + 1, context, reasoner, old.snapshot_name)
+
+    def _reasoner(self, store, context, name=None):
+        if self.use_snapshot:
+            return DatalogReasoner.load(store=store, snapshot_dir=self.snapshot_dir, context=context, name=name)
+        return DatalogReasoner(store=store, context=context)
+
+    def _rebuild(self, state):
+        old = self._current
+        start_time = time.time()
+        try:
+            snapshot = self._build(old)
+        except Exception as e:
+            self.failures += 1
+            print(f"Ricaricamento dei dati fallito, resta in servizio la versione {old.version}: {e}")
+            return
+
+        # I file devono essere ancora quelli da cui è partita la costruzione
+        current_state = {source: DatasetWatcher._key(path) for source, path in self.watcher.paths.items()}
+        if any(current_state[source] is None or state[source] is None or
+               current_state[source]['digest'] != state[source]['digest'] for source in state):
+            self.failures += 1
+            print("Dati modificati durante il ricaricamento, lo snapshot verrà ricostruito")
+            return
+
+        self._current = snapshot
+        self.reloads += 1
+        print(f"Dati ricaricati: versione {snapshot.version} in servizio "
+              f"(costruita in {time.time() - start_time:.2f} secondi)")
+        if self.on_swap is not None:
+            self.on_swap(snapshot)
+
+    def start(self):
+        """Avvia il thread che controlla periodicamente i file"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ferma il controllo periodico e attende l'eventuale costruzione in corso"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.wait()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Errore nel controllo dei dati: {e}")
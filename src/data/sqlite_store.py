@@ -0,0 +1,272 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from geopy.distance import geodesic
+from src.data.dataset_cache import CACHE_DIR, cache_path, source_key, is_current
+from src.knowledge.attraction_arrays import EARTH_RADIUS_KM, HAVERSINE_MARGIN, haversine_km
+from src.knowledge.kb_snapshot import file_digest
+
+# Da incrementare quando cambia lo schema del database
+SCHEMA_VERSION = 1
+
+# Righe inserite per blocco durante la costruzione (in memoria resta un blocco alla volta)
+INSERT_CHUNK_SIZE = 50_000
+
+ATTRACTION_COLUMNS = {
+    'id_attrazione': 'INTEGER',
+    'nome': 'TEXT',
+    'categoria': 'TEXT',
+    'latitudine': 'REAL',
+    'longitudine': 'REAL',
+    'recensione_media': 'REAL',
+    'costo': 'REAL',
+    'tempo_visita': 'INTEGER',
+    'descrizione': 'TEXT',
+}
+TOURIST_COLUMNS = {
+    'id_turista': 'INTEGER',
+    'arte': 'INTEGER',
+    'storia': 'INTEGER',
+    'natura': 'INTEGER',
+    'divertimento': 'INTEGER',
+    'tempo': 'INTEGER',
+}
+
+# Indici secondari: (nome, tabella, colonne)
+INDEXES = [
+    ('idx_attrazioni_id', 'attrazioni', 'id_attrazione'),
+    ('idx_attrazioni_categoria', 'attrazioni', 'categoria'),
+    ('idx_attrazioni_recensione', 'attrazioni', 'recensione_media'),
+    ('idx_attrazioni_costo', 'attrazioni', 'costo'),
+    ('idx_attrazioni_tempo', 'attrazioni', 'tempo_visita, recensione_media'),
+    ('idx_turisti_id', 'turisti', 'id_turista'),
+]
+
+
+def database_path(attractions_path, cache_dir=None):
+    """Percorso del database SQLite ricavato dal CSV delle attrazioni"""
+    return os.path.splitext(cache_path(attractions_path, cache_dir or CACHE_DIR))[0] + '.sqlite'
+
+
+def _create_table(connection, table, columns):
+    # posizione = numero di riga nel CSV: i risultati mantengono l'ordine del dataset
+    definition = ', '.join(f'{column} {kind}' for column, kind in columns.items())
+    connection.execute(f'CREATE TABLE {table} (posizione INTEGER PRIMARY KEY, {definition})')
+
+
+def _insert_csv(connection, table, columns, file_path, chunk_size):
+    """Inserisce il CSV a blocchi; restituisce il numero di righe"""
+    rows = 0
+    placeholders = ', '.join('?' * (len(columns) + 1))
+    with pd.read_csv(file_path, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            chunk = chunk[list(columns)].astype(object).where(chunk[list(columns)].notna(), None)
+            positions = range(rows, rows + len(chunk))
+            connection.executemany(f'INSERT INTO {table} VALUES ({placeholders})',
+                                   ([position, *values] for position, values in
+                                    zip(positions, chunk.itertuples(index=False, name=None))))
+            if table == 'attrazioni':
+                # Il R*Tree memorizza un rettangolo per attrazione (degenere: un punto)
+                connection.executemany('INSERT INTO attrazioni_rtree VALUES (?, ?, ?, ?, ?)',
+                                       ((position, lat, lat, lon, lon) for position, lat, lon in
+                                        zip(positions, chunk['latitudine'], chunk['longitudine'])
+                                        if lat is not None and lon is not None))
+            rows += len(chunk)
+    return rows
+
+
+def write_database(attractions_path, tourists_path, path, chunk_size=INSERT_CHUNK_SIZE):
+    """
+    Costruisce il database SQLite dei due CSV in modo atomico, leggendoli a blocchi:
+    tabelle attrazioni e turisti, indici secondari e R*Tree delle coordinate
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    sources = {name: dict(source_key(file_path), digest=file_digest(file_path))
+               for name, file_path in (('attractions', attractions_path), ('tourists', tourists_path))}
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        _create_table(connection, 'attrazioni', ATTRACTION_COLUMNS)
+        _create_table(connection, 'turisti', TOURIST_COLUMNS)
+        connection.execute('CREATE VIRTUAL TABLE attrazioni_rtree USING rtree(posizione, min_lat, max_lat, '
+                           'min_lon, max_lon)')
+        connection.execute('CREATE TABLE meta (chiave TEXT PRIMARY KEY, valore TEXT)')
+        _insert_csv(connection, 'attrazioni', ATTRACTION_COLUMNS, attractions_path, chunk_size)
+        _insert_csv(connection, 'turisti', TOURIST_COLUMNS, tourists_path, chunk_size)
+        # Indici creati dopo l'inserimento (più veloce che mantenerli riga per riga)
+        for name, table, columns in INDEXES:
+            connection.execute(f'CREATE INDEX {name} ON {table} ({columns})')
+        connection.executemany('INSERT INTO meta VALUES (?, ?)',
+                               [('version', str(SCHEMA_VERSION)), ('sources', json.dumps(sources))])
+        connection.execute('ANALYZE')
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+class SQLiteStore:
+    """
+    Catalogo di attrazioni e turisti in un database SQLite in sola lettura.
+
+    I filtri su tempo di visita, valutazione, costo e categoria sono query sugli indici
+    secondari e la ricerca per vicinanza interroga il R*Tree con il rettangolo che contiene
+    il cerchio di ricerca, confermando poi i candidati con la distanza geodetica: la memoria
+    usata dipende dai risultati e non dalla dimensione del catalogo. Ogni thread usa una
+    propria connessione; l'oggetto può essere passato ad altri processi (riapre il file).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        meta = dict(self.connection.execute('SELECT chiave, valore FROM meta').fetchall())
+        if int(meta.get('version', -1)) != SCHEMA_VERSION:
+            raise ValueError(f"{path} non è un database del catalogo valido (versione {SCHEMA_VERSION})")
+        self.sources = json.loads(meta['sources'])
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    @property
+    def connection(self):
+        """Connessione in sola lettura del thread corrente"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        """Chiude la connessione del thread corrente"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM attrazioni').fetchone()[0]
+
+    def _ids(self, where, params=()):
+        """ID delle attrazioni che soddisfano la condizione, nell'ordine del dataset"""
+        cursor = self.connection.execute(f'SELECT id_attrazione FROM attrazioni WHERE {where} ORDER BY posizione',
+                                         params)
+        return [row[0] for row in cursor]
+
+    def _record(self, table, id_column, columns, record_id):
+        names = ', '.join(columns)
+        row = self.connection.execute(f'SELECT {names} FROM {table} WHERE {id_column} = ? ORDER BY posizione '
+                                      f'LIMIT 1', (int(record_id),)).fetchone()
+        return dict(zip(columns, row)) if row is not None else None
+
+    def attraction(self, attraction_id):
+        """Attrazione con l'ID indicato come dizionario (o None se non esiste)"""
+        return self._record('attrazioni', 'id_attrazione', list(ATTRACTION_COLUMNS), attraction_id)
+
+    def tourist(self, tourist_id):
+        """Profilo del turista con l'ID indicato come dizionario (o None se non esiste)"""
+        return self._record('turisti', 'id_turista', list(TOURIST_COLUMNS), tourist_id)
+
+    def within_time(self, max_time, min_rating):
+        """ID delle attrazioni con tempo di visita <= max_time e valutazione >= min_rating"""
+        return self._ids('tempo_visita <= ? AND recensione_media >= ?', (max_time, min_rating))
+
+    def cheaper_than(self, max_cost):
+        """ID delle attrazioni con costo < max_cost"""
+        return self._ids('costo < ?', (max_cost,))
+
+    def rated_above(self, min_rating):
+        """ID delle attrazioni con valutazione > min_rating"""
+        return self._ids('recensione_media > ?', (min_rating,))
+
+    def in_categories(self, categories):
+        """ID delle attrazioni delle categorie indicate"""
+        categories = list(categories)
+        if not categories:
+            return []
+        return self._ids(f"categoria IN ({', '.join('?' * len(categories))})", categories)
+
+    def top_rated(self, n):
+        """ID delle n attrazioni con la valutazione più alta"""
+        cursor = self.connection.execute('SELECT id_attrazione FROM attrazioni ORDER BY recensione_media DESC, '
+                                         'posizione LIMIT ?', (n,))
+        return [row[0] for row in cursor]
+
+    def near(self, lat, lon, max_distance, exclude_id=None):
+        """
+        ID delle attrazioni entro max_distance km (geodetica) dal punto, nell'ordine del
+        dataset: rettangolo di ricerca sul R*Tree, prefiltro sulla sfera e distanza
+        geodetica solo per i candidati nella fascia incerta (come AttractionArrays)
+        """
+        reach = max_distance * HAVERSINE_MARGIN
+        dlat = math.degrees(reach / EARTH_RADIUS_KM)
+        # Ampiezza in longitudine alla latitudine più lontana dall'equatore del rettangolo
+        extreme = min(90.0, abs(lat) + dlat)
+        cos_extreme = math.cos(math.radians(extreme))
+        dlon = 180.0 if cos_extreme < 1e-9 else min(180.0, math.degrees(reach / (EARTH_RADIUS_KM * cos_extreme)))
+
+        # Il rettangolo può attraversare l'antimeridiano: diventa due intervalli di longitudine
+        low, high = lon - dlon, lon + dlon
+        if dlon >= 180.0:
+            ranges = [(-180.0, 180.0)]
+        elif low < -180.0:
+            ranges = [(low + 360.0, 180.0), (-180.0, high)]
+        elif high > 180.0:
+            ranges = [(low, 180.0), (-180.0, high - 360.0)]
+        else:
+            ranges = [(low, high)]
+        lon_filter = ' OR '.join('(r.max_lon >= ? AND r.min_lon <= ?)' for _ in ranges)
+        params = [lat - dlat, lat + dlat] + [bound for lon_range in ranges for bound in lon_range]
+        rows = self.connection.execute(
+            'SELECT a.posizione, a.id_attrazione, a.latitudine, a.longitudine FROM attrazioni_rtree r '
+            'JOIN attrazioni a ON a.posizione = r.posizione '
+            f'WHERE r.max_lat >= ? AND r.min_lat <= ? AND ({lon_filter}) ORDER BY a.posizione', params).fetchall()
+        if not rows:
+            return []
+
+        _, ids, lats, lons = (np.asarray(column) for column in zip(*rows))
+        lats, lons = lats.astype(float), lons.astype(float)
+        distances = haversine_km(lat, lon, lats, lons)
+        close = distances <= reach
+        if exclude_id is not None:
+            close &= ids != int(exclude_id)
+        uncertain = np.flatnonzero(close & (distances > max_distance / HAVERSINE_MARGIN))
+        for i in uncertain.tolist():
+            close[i] = geodesic((lat, lon), (lats[i], lons[i])).kilometers <= max_distance
+        return ids[close].tolist()
+
+
+def is_fresh(store, attractions_path, tourists_path):
+    """True se il database è stato costruito dal contenuto attuale dei due CSV"""
+    return (is_current(store.sources.get('attractions'), attractions_path) and
+            is_current(store.sources.get('tourists'), tourists_path))
+
+
+def open_database(attractions_path, tourists_path, cache_dir=None):
+    """
+    Apre il database SQLite ricavato dai due CSV, ricostruendolo se manca o se uno dei
+    CSV è cambiato (stessi criteri di validità della cache colonnare)
+    """
+    path = database_path(attractions_path, cache_dir)
+    if os.path.exists(path):
+        try:
+            store = SQLiteStore(path)
+            if is_fresh(store, attractions_path, tourists_path):
+                return store
+            store.close()
+        except (ValueError, sqlite3.Error) as e:
+            print(f"Database {path} non leggibile, verrà ricostruito: {e}")
+    write_database(attractions_path, tourists_path, path)
+    return SQLiteStore(path)
@@ -0,0 +1,217 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Zone di Roma attorno a cui si concentrano le attrazioni: (nome, latitudine, longitudine, raggio in km, peso)
+ROME_HOTSPOTS = [
+    ('Colosseo', 41.8902, 12.4922, 0.8, 0.18),
+    ('Vaticano', 41.9029, 12.4534, 0.7, 0.16),
+    ('Pantheon', 41.8986, 12.4769, 0.6, 0.16),
+    ('Villa Borghese', 41.9142, 12.4921, 0.9, 0.12),
+    ('Trastevere', 41.8897, 12.4695, 0.6, 0.10),
+    ('Termini', 41.9010, 12.5011, 0.7, 0.08),
+    ('Aventino', 41.8830, 12.4800, 0.6, 0.08),
+    ('Appia Antica', 41.8560, 12.5150, 1.5, 0.07),
+    ('EUR', 41.8350, 12.4690, 1.2, 0.05),
+]
+
+# Riquadro di Roma per le attrazioni non legate a una zona
+ROME_BOUNDS = ((41.80, 41.99), (12.37, 12.62))
+
+# Composizione predefinita delle categorie (come nel dataset reale: prevalenza di storia e arte)
+DEFAULT_CATEGORY_MIX = {'Storia': 0.40, 'Arte': 0.27, 'Divertimento': 0.20, 'Natura': 0.13}
+
+# Per categoria: (mediana del tempo di visita in minuti, dispersione lognormale,
+#                 probabilità di ingresso gratuito, costo medio se a pagamento)
+DEFAULT_CATEGORY_PROFILES = {
+    'Arte': (120, 0.45, 0.25, 16.0),
+    'Storia': (90, 0.55, 0.45, 14.0),
+    'Natura': (90, 0.50, 0.85, 8.0),
+    'Divertimento': (180, 0.50, 0.30, 25.0),
+}
+
+# Tipi di luogo e descrizioni per categoria; ogni descrizione contiene il nome della propria
+# categoria (e di nessun'altra), da cui il reasoner ricava has_category
+PLACE_KINDS = {
+    'Arte': ['Museo', 'Galleria', 'Cappella', 'Basilica'],
+    'Storia': ['Foro', 'Tempio', 'Rovine', 'Palazzo storico'],
+    'Natura': ['Parco', 'Villa', 'Giardino', 'Orto'],
+    'Divertimento': ['Parco giochi', 'Luna park', 'Acquario', 'Teatro'],
+}
+DESCRIPTIONS = {
+    'Arte': ["Museo con opere d'arte rinascimentale e barocca.",
+             "Galleria d'arte con dipinti e sculture.",
+             "Basilica ricca di mosaici e affreschi, capolavori dell'arte sacra."],
+    'Storia': ["Sito antico che racconta la storia della Roma imperiale.",
+               "Rovine di un edificio romano ricche di storia.",
+               "Complesso con i resti del foro antico e secoli di storia."],
+    'Natura': ["Parco con ampi spazi verdi immersi nella natura.",
+               "Villa circondata da un giardino ricco di natura.",
+               "Area verde ideale per passeggiate nella natura."],
+    'Divertimento': ["Luogo di divertimento per famiglie e bambini.",
+                     "Attrazione di svago e divertimento con spettacoli.",
+                     "Parco di divertimento con giostre."],
+}
+
+# Tempo disponibile dei turisti (minuti) e relative probabilità
+TOURIST_TIMES = ([120, 180, 240, 300, 360, 480], [0.10, 0.15, 0.25, 0.20, 0.15, 0.15])
+
+KM_PER_DEGREE = 111.32
+
+
+def _normalized(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+def _mix_weights(category_mix, names, description):
+    """
+    Pesi di category_mix per le categorie names (0 per quelle assenti)
+    ValueError se un peso non è un numero finito non negativo o se la somma è nulla
+    """
+    for category, weight in category_mix.items():
+        if not np.isfinite(weight) or weight < 0:
+            raise ValueError(f"category_mix: peso non valido per {category!r} ({weight})")
+    weights = [float(category_mix.get(name, 0.0)) for name in names]
+    if sum(weights) <= 0:
+        raise ValueError(f"category_mix {dict(category_mix)} non assegna alcun peso alle {description} "
+                         f"{list(names)}")
+    return _normalized(weights)
+
+
+def generate_attractions(num_attractions, seed=42, hotspots=ROME_HOTSPOTS, cluster_fraction=0.85,
+                         category_mix=None, category_profiles=None):
+    """
+    Genera un catalogo sintetico di attrazioni con lo schema di attrazioni_roma.csv
+
+    Args:
+        num_attractions: numero di attrazioni
+        seed: seme del generatore (stesso seme e parametri = stesso dataset)
+        hotspots: zone (nome, lat, lon, raggio km, peso) attorno a cui si concentrano le attrazioni
+        cluster_fraction: frazione di attrazioni nelle zone; le altre sono uniformi nel riquadro di Roma
+        category_mix: dizionario categoria -> peso (default DEFAULT_CATEGORY_MIX); ogni categoria
+                      deve avere un profilo (ValueError altrimenti)
+        category_profiles: dizionario categoria -> (mediana tempo, dispersione, prob. gratuito,
+                           costo medio) (default DEFAULT_CATEGORY_PROFILES)
+
+    Returns:
+        DataFrame con le colonne e i tipi del dataset reale
+    """
+    rng = np.random.default_rng(seed)
+    category_mix = category_mix or DEFAULT_CATEGORY_MIX
+    category_profiles = dict(DEFAULT_CATEGORY_PROFILES, **(category_profiles or {}))
+    n = num_attractions
+
+    # Categorie (ognuna deve avere un profilo di tempo e costo)
+    names = list(category_mix)
+    unknown = [name for name in names if name not in category_profiles]
+    if unknown:
+        raise ValueError(f"category_mix: categorie senza profilo {unknown}; le categorie note sono "
+                         f"{list(category_profiles)} (altre vanno descritte con category_profiles)")
+    category_codes = rng.choice(len(names), size=n, p=_mix_weights(category_mix, names, "categorie"))
+    categories = np.array(names, dtype=object)[category_codes]
+
+    # Posizioni: miscela di gaussiane attorno alle zone più una componente uniforme
+    latitudes = rng.uniform(*ROME_BOUNDS[0], size=n)
+    longitudes = rng.uniform(*ROME_BOUNDS[1], size=n)
+    clustered = rng.random(n) < cluster_fraction
+    if hotspots and clustered.any():
+        spots = rng.choice(len(hotspots), size=int(clustered.sum()), p=_normalized([h[4] for h in hotspots]))
+        spot_lat = np.array([h[1] for h in hotspots])[spots]
+        spot_lon = np.array([h[2] for h in hotspots])[spots]
+        radius_km = np.array([h[3] for h in hotspots])[spots]
+        latitudes[clustered] = spot_lat + rng.normal(0, 1, spots.size) * radius_km / KM_PER_DEGREE
+        longitudes[clustered] = spot_lon + rng.normal(0, 1, spots.size) * radius_km / (
+                KM_PER_DEGREE * np.cos(np.radians(spot_lat)))
+
+    # Tempo di visita (lognormale, multipli di 5 minuti) e costo (gratuito o gamma) per categoria
+    visit_times = np.empty(n, dtype=np.int64)
+    costs = np.empty(n, dtype=float)
+    for code, name in enumerate(names):
+        mask = category_codes == code
+        count = int(mask.sum())
+        median, sigma, free_probability, mean_cost = category_profiles[name]
+        minutes = median * np.exp(rng.normal(0, sigma, count))
+        visit_times[mask] = np.clip(np.round(minutes / 5) * 5, 15, 480).astype(np.int64)
+        paid = rng.random(count) >= free_probability
+        costs[mask] = np.where(paid, np.round(rng.gamma(4.0, mean_cost / 4.0, count)), 0.0)
+
+    ratings = np.clip(np.round(rng.normal(4.3, 0.35, n), 1), 1.0, 5.0)
+
+    ids = np.arange(1, n + 1)
+    kinds = [PLACE_KINDS.get(name, [name]) for name in names]
+    descriptions = [DESCRIPTIONS.get(name, [name]) for name in names]
+    kind_choice = rng.integers(0, 1 << 30, n)
+    description_choice = rng.integers(0, 1 << 30, n)
+    place_names = [f"{kinds[code][k % len(kinds[code])]} {attr_id}"
+                   for attr_id, code, k in zip(ids.tolist(), category_codes.tolist(), kind_choice.tolist())]
+    place_descriptions = [descriptions[code][d % len(descriptions[code])]
+                          for code, d in zip(category_codes.tolist(), description_choice.tolist())]
+
+    return pd.DataFrame({
+        'id_attrazione': ids,
+        'nome': place_names,
+        'categoria': categories,
+        'latitudine': np.round(latitudes, 7),
+        'longitudine': np.round(longitudes, 7),
+        'recensione_media': ratings,
+        'costo': costs,
+        'tempo_visita': visit_times,
+        'descrizione': place_descriptions,
+    })
+
+
+def generate_tourists(num_tourists, seed=42, category_mix=None):
+    """
+    Genera profili sintetici di turisti con lo schema di preferenze_turista.csv
+
+    Ogni turista ha una categoria preferita (scelta secondo category_mix) con punteggio
+    da 7 a 10; gli altri interessi hanno punteggi da 1 a 10 centrati su valori medi.
+
+    Args:
+        num_tourists: numero di turisti
+        seed: seme del generatore
+        category_mix: dizionario categoria -> peso per la categoria preferita (le categorie
+                      diverse da Arte, Storia, Natura e Divertimento sono ignorate; ValueError
+                      se nessuna di queste ha un peso positivo)
+    """
+    rng = np.random.default_rng(seed)
+    category_mix = category_mix or DEFAULT_CATEGORY_MIX
+    columns = ['arte', 'storia', 'natura', 'divertimento']
+    n = num_tourists
+
+    scores = np.clip(np.round(rng.normal(5, 2.2, (n, len(columns)))), 1, 10).astype(np.int64)
+    weights = _mix_weights(category_mix, [column.capitalize() for column in columns], "categorie dei turisti")
+    favourite = rng.choice(len(columns), size=n, p=weights)
+    scores[np.arange(n), favourite] = rng.integers(7, 11, n)
+
+    data = {'id_turista': np.arange(1, n + 1)}
+    for i, column in enumerate(columns):
+        data[column] = scores[:, i]
+    data['tempo'] = rng.choice(TOURIST_TIMES[0], size=n, p=TOURIST_TIMES[1]).astype(np.int64)
+    return pd.DataFrame(data)
+
+
+def write_dataset(directory, num_attractions, num_tourists, seed=42, **options):
+    """
+    Scrive un dataset sintetico (attrazioni_roma.csv e preferenze_turista.csv) in directory
+
+    Args:
+        directory: directory di destinazione (creata se non esiste)
+        num_attractions: numero di attrazioni
+        num_tourists: numero di turisti
+        seed: seme del generatore (i turisti usano seed + 1)
+        options: parametri aggiuntivi di generate_attractions (category_mix è usato anche per i turisti)
+
+    Returns:
+        (percorso del CSV delle attrazioni, percorso del CSV dei turisti)
+    """
+    os.makedirs(directory, exist_ok=True)
+    attractions_path = os.path.join(directory, 'attrazioni_roma.csv')
+    tourists_path = os.path.join(directory, 'preferenze_turista.csv')
+    # Entrambi i dataset sono generati (e category_mix verificato) prima di scrivere i file
+    attractions = generate_attractions(num_attractions, seed, **options)
+    tourists = generate_tourists(num_tourists, seed + 1, options.get('category_mix'))
+    attractions.to_csv(attractions_path, index=False)
+    tourists.to_csv(tourists_path, index=False)
+    return attractions_path, tourists_path
@@ -0,0 +1,137 @@
+import numpy as np
+from geopy.distance import geodesic
+
+# Raggio medio terrestre (km) usato dal prefiltro sferico
+EARTH_RADIUS_KM = 6371.0088
+
+# Tolleranza relativa del prefiltro: la distanza sulla sfera differisce da quella
+# geodetica sull'ellissoide WGS-84 di meno dello 0.6%, per cui entro max / margine
+# un punto è sicuramente vicino, oltre max * margine sicuramente lontano; solo i punti
+# nella fascia intermedia richiedono il calcolo geodetico esatto
+HAVERSINE_MARGIN = 1.01
+
+# Numero massimo di coppie origine-destinazione valutate in un blocco del calcolo batch
+BATCH_PAIRS = 1 << 22
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distanza sulla sfera (km) tra coordinate in gradi; accetta array con broadcasting"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class Neighbours:
+    """
+    Matrice sparsa in formato CSR: la riga i contiene le posizioni (nell'ordine del
+    DataFrame delle attrazioni) in indices[indptr[i]:indptr[i + 1]]
+    """
+
+    def __init__(self, indptr, indices, ids):
+        self.indptr = indptr
+        self.indices = indices
+        self.ids = ids  # posizione -> ID dell'attrazione
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def row(self, i):
+        """Restituisce gli ID delle attrazioni della riga i"""
+        return self.ids[self.indices[self.indptr[i]:self.indptr[i + 1]]].tolist()
+
+    def rows(self):
+        """Restituisce tutte le righe come liste di ID"""
+        return [self.row(i) for i in range(len(self))]
+
+
+class AttractionArrays:
+    """
+    Colonne delle attrazioni come array NumPy per i filtri vettoriali su distanza,
+    tempo di visita e valutazione. La posizione in ogni array è quella della riga nel
+    DataFrame, per cui i risultati mantengono l'ordine del dataset.
+    """
+
+    def __init__(self, attractions_df):
+        self.ids = attractions_df['id_attrazione'].astype(str).to_numpy()
+        self.lat = attractions_df['latitudine'].to_numpy(dtype=float)
+        self.lon = attractions_df['longitudine'].to_numpy(dtype=float)
+        self.time = attractions_df['tempo_visita'].to_numpy(dtype=float)
+        self.rating = attractions_df['recensione_media'].to_numpy(dtype=float)
+        self.positions = {}  # ID -> posizione (a parità di ID vale la prima riga)
+        for position, attr_id in enumerate(self.ids.tolist()):
+            self.positions.setdefault(attr_id, position)
+        self._by_time = None  # (posizioni ordinate per tempo, tempi ordinati, valutazioni ordinate)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def within_time(self, max_time, min_rating):
+        """ID delle attrazioni con tempo di visita <= max_time e valutazione >= min_rating"""
+        mask = (self.time <= max_time) & (self.rating >= min_rating)
+        return self.ids[mask].tolist()
+
+    def within_time_many(self, max_times, min_rating):
+        """
+        Come within_time per più soglie di tempo: le attrazioni sono ordinate una sola
+        volta per tempo di visita e ogni soglia diventa una ricerca binaria
+
+        Returns:
+            Neighbours con una riga per soglia
+        """
+        if self._by_time is None:
+            order = np.argsort(self.time, kind='stable')
+            self._by_time = (order, self.time[order], self.rating[order])
+        order, times, ratings = self._by_time
+        ends = np.searchsorted(times, np.asarray(max_times, dtype=float), side='right')
+
+        rows = []
+        for end in ends:
+            selected = order[:end][ratings[:end] >= min_rating]
+            rows.append(np.sort(selected))
+        return self._csr(rows)
+
+    def near(self, position, max_distance):
+        """
+        Posizioni delle attrazioni entro max_distance km (geodetica) da quella in position,
+        esclusa l'origine: prefiltro vettoriale sulla sfera e conferma esatta dei candidati
+        """
+        distances = haversine_km(self.lat[position], self.lon[position], self.lat, self.lon)
+        return self._confirm(position, distances, max_distance)
+
+    def near_many(self, positions, max_distance):
+        """
+        Vicini di più origini in un colpo solo; i prefiltri sono calcolati a blocchi
+        di origini per limitare la memoria (None in positions = riga vuota)
+
+        Returns:
+            Neighbours con una riga per origine
+        """
+        rows = [np.empty(0, dtype=np.intp)] * len(positions)
+        valid = [i for i, position in enumerate(positions) if position is not None]
+        block = max(1, BATCH_PAIRS // max(1, len(self)))
+        for start in range(0, len(valid), block):
+            chunk = valid[start:start + block]
+            sources = np.asarray([positions[i] for i in chunk])
+            distances = haversine_km(self.lat[sources, None], self.lon[sources, None], self.lat, self.lon)
+            for i, source, row in zip(chunk, sources.tolist(), distances):
+                rows[i] = self._confirm(source, row, max_distance)
+        return self._csr(rows)
+
+    def _confirm(self, position, distances, max_distance):
+        """
+        Dalle distanze sferiche dall'origine alle posizioni dell'array seleziona i vicini
+        (esclusa l'origine), ricorrendo alla distanza geodetica solo nella fascia incerta
+        """
+        close = distances <= max_distance * HAVERSINE_MARGIN
+        close &= self.ids != self.ids[position]
+        uncertain = np.flatnonzero(close & (distances > max_distance / HAVERSINE_MARGIN))
+        source = (self.lat[position], self.lon[position])
+        for i in uncertain.tolist():
+            close[i] = geodesic(source, (self.lat[i], self.lon[i])).kilometers <= max_distance
+        return np.flatnonzero(close)
+
+    def _csr(self, rows):
+        indptr = np.zeros(len(rows) + 1, dtype=np.intp)
+        np.cumsum([len(r) for r in rows], out=indptr[1:])
+        indices = np.concatenate(rows).astype(np.intp) if rows else np.empty(0, dtype=np.intp)
+        return Neighbours(indptr, indices, self.ids)
@@ -0,0 +1,279 @@
+import copy
+import pandas as pd
+from collections import Counter, defaultdict
+from lib.logicRelation import Var, Atom, log_vars, unify, apply
+
+# Built-in di confronto in forma vettoriale (operano su Series pandas o su scalari)
+VECTOR_COMPARISONS = {
+    'lt': lambda a, b: a < b,
+    'le': lambda a, b: a <= b,
+    'between': lambda low, high, x: (low <= x) & (x <= high),
+}
+
+
+class ColumnarFactStore:
+    """
+    Base di fatti colonnare alternativa alla KB a clausole.
+
+    Ogni predicato estensionale è un DataFrame con una colonna per argomento
+    (colonne 0, 1, ...). I corpi delle regole sono valutati come join hash
+    vettoriali (DataFrame.merge) e i built-in di confronto come filtri booleani.
+    Espone la stessa interfaccia di interrogazione della KB (ask_all, ask_one,
+    add_clause, remove_clause), per cui il reasoner può usare l'una o l'altra.
+
+    Gli aggiornamenti dei fatti non copiano la relazione: le righe aggiunte e rimosse
+    sono accumulate e applicate tutte insieme alla prima lettura della relazione.
+    """
+
+    def __init__(self, attractions_df, tourists_df, rules, categories):
+        """
+        Costruisce le relazioni direttamente dalle colonne dei DataFrame
+        attractions_df: DataFrame delle attrazioni
+        tourists_df: DataFrame dei turisti (può essere None)
+        rules: lista di regole Datalog (Clause)
+        categories: categorie riconosciute nelle descrizioni e nei profili
+        """
+        self.relations = {}
+        self.rules = defaultdict(list)
+        self.added = defaultdict(list)    # predicato -> righe da aggiungere alla relazione
+        self.removed = defaultdict(list)  # predicato -> righe da rimuovere (prime occorrenze)
+        self.row_counts = {}  # predicato -> molteplicità delle righe, costruita al primo aggiornamento
+
+        if attractions_df is not None:
+            ids = attractions_df['id_attrazione'].astype(str).reset_index(drop=True)
+            self.relations['attraction'] = pd.DataFrame({0: ids})
+            self.relations['has_cost'] = pd.DataFrame({0: ids, 1: attractions_df['costo'].to_numpy()})
+            self.relations['has_rating'] = pd.DataFrame({0: ids, 1: attractions_df['recensione_media'].to_numpy()})
+            self.relations['has_location'] = pd.DataFrame({0: ids,
+                                                           1: attractions_df['latitudine'].to_numpy(),
+                                                           2: attractions_df['longitudine'].to_numpy()})
+
+            # Categorie in base alla descrizione
+            descriptions = attractions_df['descrizione'].str.lower().reset_index(drop=True)
+            self.relations['has_category'] = pd.concat(
+                [pd.DataFrame({0: ids[descriptions.str.contains(category, regex=False)], 1: category})
+                 for category in categories],
+                ignore_index=True)
+
+        if tourists_df is not None:
+            tourist_ids = tourists_df['id_turista'].astype(str).reset_index(drop=True)
+            # Interessi con punteggio sopra la soglia
+            self.relations['tourist_likes'] = pd.concat(
+                [pd.DataFrame({0: tourist_ids[(tourists_df[category] > 5).to_numpy()], 1: category})
+                 for category in categories],
+                ignore_index=True)
+
+        for rule in rules:
+            self.add_clause(rule)
+
+    def add_clause(self, c):
+        """Aggiunge una regola o un fatto (come nuova riga della relazione)"""
+        if c.body:
+            self.rules[c.head.name].append(c)
+            return
+        if c.head.name in self.rules:
+            raise ValueError(f"{c.head.name} è un predicato derivato")
+        if any(isinstance(arg, (Var, Atom)) for arg in c.head.args):
+            raise ValueError(f"Il fatto {c.head} non è ground")
+        row = tuple(c.head.args)
+        counts = self._row_counts(c.head.name, len(row))
+        if counts is None:
+            self.relations[c.head.name] = pd.DataFrame([row], columns=range(len(row)))
+            return
+        if len(self.relations[c.head.name].columns) != len(row):
+            raise ValueError(f"Numero di argomenti errato per {c.head.name}: {c.head}")
+        counts[row] = counts.get(row, 0) + 1
+        self.added[c.head.name].append(row)
+
+    def remove_clause(self, c):
+        """Rimuove un fatto (una riga uguale); restituisce True se è stato rimosso"""
+        if c.body:
+            rules = self.rules.get(c.head.name, [])
+            for rule in rules:
+                if str(rule) == str(c):
+                    rules.remove(rule)
+                    return True
+            return False
+        row = tuple(c.head.args)
+        counts = self._row_counts(c.head.name, len(row))
+        if not counts or not counts.get(row):
+            return False
+        counts[row] -= 1
+        if not counts[row]:
+            del counts[row]
+        self.removed[c.head.name].append(row)
+        return True
+
+    def _row_counts(self, name, arity):
+        """Molteplicità delle righe di name (None se la relazione non esiste, {} se ha un'altra arità)"""
+        counts = self.row_counts.get(name)
+        if counts is None:
+            relation = self.relation(name)
+            if relation is None:
+                return None
+            if len(relation.columns) != arity:
+                return {}
+            counts = self.row_counts[name] = Counter(zip(*(relation[pos].tolist() for pos in relation.columns)))
+        return counts
+
+    def relation(self, name):
+        """Restituisce la relazione name (None se non esiste) dopo aver applicato gli aggiornamenti in sospeso"""
+        if name in self.added or name in self.removed:
+            self._flush(name)
+        return self.relations.get(name)
+
+    def _flush(self, name):
+        """Applica alla relazione name le righe aggiunte e rimosse dall'ultima lettura"""
+        relation = self.relations[name]
+        added = self.added.pop(name, None)
+        if added:
+            relation = pd.concat([relation, pd.DataFrame(added, columns=relation.columns)], ignore_index=True)
+        removed = self.removed.pop(name, None)
+        if removed:
+            # Ogni riga rimossa elimina la prima occorrenza ancora presente, come rimozioni singole in sequenza
+            columns = list(relation.columns)
+            occurrences = pd.DataFrame(removed, columns=columns)
+            occurrences['occorrenza'] = occurrences.groupby(columns, sort=False, dropna=False).cumcount()
+            numbered = relation.assign(occorrenza=relation.groupby(columns, sort=False, dropna=False).cumcount())
+            matched = numbered.merge(occurrences, on=columns + ['occorrenza'], how='left', indicator=True)
+            relation = relation[(matched['_merge'] == 'left_only').to_numpy()].reset_index(drop=True)
+        self.relations[name] = relation
+
+    def restricted(self, name, position, values):
+        """
+        Restituisce una copia della base in cui la relazione name contiene solo le righe
+        con l'argomento in posizione position tra values (le altre relazioni sono condivise)
+        """
+        for pending in list(self.added) + list(self.removed):
+            self.relation(pending)
+        store = copy.copy(self)
+        store.relations = dict(self.relations)
+        store.added, store.removed, store.row_counts = defaultdict(list), defaultdict(list), {}
+        relation = self.relations.get(name)
+        if relation is not None:
+            store.relations[name] = relation[relation[position].isin(values)].reset_index(drop=True)
+        return store
+
+    def ask_frame(self, query):
+        """
+        Risponde a una query (lista di atomi)
+        Restituisce un DataFrame con una colonna per ogni variabile della query
+        """
+        return self._solve_body(query, set())
+
+    def ask_all(self, query):
+        """Restituisce tutte le risposte come lista di dizionari {variabile: valore}"""
+        frame = self.ask_frame(query)
+        qvars = list(log_vars(query, set()))
+        columns = [frame[v.name].tolist() for v in qvars]
+        return [dict(zip(qvars, values)) for values in zip(*columns)] if qvars else [{}] * len(frame)
+
+    def ask_one(self, query):
+        """Restituisce una risposta alla query o None se non ce ne sono"""
+        for ans in self.ask_all(query):
+            return ans
+
+    def _relation_frame(self, atom, visiting):
+        """Restituisce la relazione di atom con colonne posizionali (specializzata sulle costanti di atom)"""
+        if atom.name not in self.rules:
+            relation = self.relation(atom.name)
+            if relation is None:
+                return pd.DataFrame(columns=range(len(atom.args)))
+            return relation
+
+        if atom.name in visiting:
+            raise ValueError(f"Regole ricorsive non supportate dalla base colonnare ({atom.name})")
+        visiting = visiting | {atom.name}
+
+        frames = []
+        for rule in self.rules[atom.name]:
+            clause = rule.rename()
+            sub = unify(atom, clause.head)
+            if sub is False:
+                continue
+            # Le costanti della chiamata sono propagate nel corpo della regola
+            target = apply(atom, sub)
+            solutions = self._solve_body(apply(clause.body, sub), visiting)
+            columns = {}
+            for pos, arg in enumerate(target.args):
+                if isinstance(arg, Var):
+                    if arg.name not in solutions.columns:
+                        raise ValueError(f"Regola non sicura: {rule}")
+                    columns[pos] = solutions[arg.name].to_numpy()
+                else:
+                    columns[pos] = [arg] * len(solutions)
+            frames.append(pd.DataFrame(columns, columns=range(len(atom.args))))
+        if not frames:
+            return pd.DataFrame(columns=range(len(atom.args)))
+        return pd.concat(frames, ignore_index=True).drop_duplicates(ignore_index=True)
+
+    def _atom_frame(self, atom, visiting):
+        """Restituisce le soluzioni di atom come DataFrame con una colonna per variabile"""
+        relation = self._relation_frame(atom, visiting)
+        mask = None
+        first = {}
+        for pos, arg in enumerate(atom.args):
+            if isinstance(arg, Var):
+                if arg.name in first:
+                    condition = relation[pos] == relation[first[arg.name]]
+                else:
+                    first[arg.name] = pos
+                    continue
+            else:
+                condition = relation[pos] == arg
+            mask = condition if mask is None else mask & condition
+        if mask is not None:
+            relation = relation[mask]
+        frame = relation[list(first.values())]
+        frame.columns = list(first.keys())
+        return frame.reset_index(drop=True)
+
+    def _apply_builtins(self, frame, builtins):
+        """Applica i confronti le cui variabili sono tutte colonne di frame; restituisce quelli rimasti"""
+        remaining = []
+        for atom in builtins:
+            names = [arg.name for arg in atom.args if isinstance(arg, Var)]
+            if all(name in frame.columns for name in names):
+                values = [frame[arg.name] if isinstance(arg, Var) else arg for arg in atom.args]
+                mask = VECTOR_COMPARISONS[atom.name](*values)
+                if isinstance(mask, pd.Series):
+                    frame = frame[mask]
+                elif not mask:
+                    frame = frame.iloc[0:0]
+            else:
+                remaining.append(atom)
+        return frame, remaining
+
+    def _solve_body(self, body, visiting):
+        """Valuta una congiunzione di atomi con join hash, partendo dalla relazione più piccola"""
+        builtins = [atom for atom in body if atom.name in VECTOR_COMPARISONS]
+        frames = []
+        for atom in body:
+            if atom.name in VECTOR_COMPARISONS:
+                continue
+            frame = self._atom_frame(atom, visiting)
+            if len(frame.columns) == 0:
+                # Atomo ground: è vero o falso
+                if len(frame) == 0:
+                    return pd.DataFrame(columns=[v.name for v in log_vars(body, set())])
+                continue
+            frames.append(frame)
+
+        if not frames:
+            result = pd.DataFrame(index=[0])
+        else:
+            frames.sort(key=len)
+            result = frames.pop(0)
+        result, builtins = self._apply_builtins(result, builtins)
+
+        while frames:
+            # Preferisci la relazione più piccola che condivide variabili con il risultato parziale
+            shared = [i for i, frame in enumerate(frames) if set(frame.columns) & set(result.columns)]
+            frame = frames.pop(shared[0] if shared else 0)
+            on = [name for name in frame.columns if name in result.columns]
+            result = result.merge(frame, on=on) if on else result.merge(frame, how='cross')
+            result, builtins = self._apply_builtins(result, builtins)
+
+        if builtins:
+            raise ValueError(f"Variabili non legate nei confronti: {[str(atom) for atom in builtins]}")
+        return result.reset_index(drop=True)
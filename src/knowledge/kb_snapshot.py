@@ -0,0 +1,95 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+# Directory degli snapshot (ignorata da git)
+PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
+SNAPSHOT_DIR = os.path.join(PROJECT_ROOT, 'datasets', '.cache')
+
+# Da incrementare quando cambia la struttura degli oggetti serializzati
+SNAPSHOT_VERSION = 13
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """Restituisce l'hash SHA-256 del contenuto di un file ('' se il file non esiste)"""
+    if not os.path.exists(file_path):
+        return ''
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_key(source_paths, rules, *extra):
+    """
+    Calcola la chiave di uno snapshot dal contenuto dei file sorgente e dalle regole
+
+    Args:
+        source_paths: percorsi dei CSV da cui è costruita la knowledge base
+        rules: regole Datalog (Clause)
+        extra: altri parametri che influenzano la costruzione (es. tipo di store)
+
+    Returns:
+        Stringa esadecimale che cambia se cambia uno qualsiasi degli input
+    """
+    digest = hashlib.sha256(f"v{SNAPSHOT_VERSION}".encode())
+    for file_path in source_paths:
+        digest.update(file_digest(file_path).encode())
+    for rule in rules:
+        digest.update(str(rule).encode())
+    for value in extra:
+        digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+def snapshot_path(name, key, directory=None):
+    """Percorso del file di snapshot per un nome logico e una chiave"""
+    return os.path.join(directory or SNAPSHOT_DIR, f"{name}-{key[:16]}.pkl")
+
+
+def write_snapshot(obj, name, key, directory=None):
+    """
+    Serializza obj su disco in modo atomico e rimuove gli snapshot obsoleti con lo stesso nome
+
+    Returns:
+        Percorso del file scritto
+    """
+    directory = directory or SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(name, key, directory)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((key, obj), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+    for file_name in os.listdir(directory):
+        stale = os.path.join(directory, file_name)
+        if file_name.startswith(f"{name}-") and file_name.endswith('.pkl') and stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+
+def read_snapshot(name, key, directory=None):
+    """
+    Carica uno snapshot se esiste ed è valido per la chiave indicata
+
+    Returns:
+        L'oggetto salvato, o None se lo snapshot manca, è obsoleto o illeggibile
+    """
+    path = snapshot_path(name, key, directory)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            saved_key, obj = pickle.load(f)
+    except Exception as e:
+        print(f"Snapshot {path} non leggibile, verrà ricostruito: {e}")
+        return None
+    if saved_key != key:
+        return None
+    return obj
@@ -0,0 +1,382 @@
+from collections import defaultdict
+from lib.logicRelation import Var, Atom, Clause
+from src.knowledge.materialized_views import COMPARISONS, Relation
+
+# Predicato della regola ausiliaria che rappresenta una query congiuntiva
+QUERY = '$query'
+
+
+def adornment(atom, bound):
+    """
+    Restituisce l'adornamento di atom: 'b' per gli argomenti costanti o con variabile
+    in bound, 'f' per quelli liberi
+    """
+    return ''.join('f' if isinstance(arg, Var) and arg not in bound else 'b' for arg in atom.args)
+
+
+def adorned_name(name, adn):
+    return f"{name}_{adn}"
+
+
+def magic_name(name, adn):
+    return f"magic_{name}_{adn}"
+
+
+def bound_args(atom, adn):
+    """Argomenti di atom nelle posizioni legate dell'adornamento"""
+    return [arg for arg, a in zip(atom.args, adn) if a == 'b']
+
+
+def left_to_right(body, bound):
+    """Ordine dei corpi delle regole della riscrittura classica (da sinistra a destra)"""
+    return list(body)
+
+
+def magic_rewrite(rules, query_atom, order=left_to_right):
+    """
+    Riscrive le regole con la trasformazione magic sets per la query query_atom.
+
+    Ogni predicato derivato raggiungibile dalla query viene specializzato per
+    l'adornamento con cui è chiamato; i binding passano tra gli atomi del corpo
+    nell'ordine dato da order (strategia di passaggio dei binding); i predicati magic
+    raccolgono i valori legati effettivamente richiesti, per cui la valutazione bottom-up
+    deriva solo i fatti rilevanti per la query.
+
+    Args:
+        rules: dizionario predicato derivato -> regole (Clause)
+        query_atom: atomo della query (costanti = argomenti legati)
+        order: funzione (corpo, variabili legate) -> corpo riordinato (default da sinistra a destra)
+
+    Returns:
+        (regole riscritte, fatto seme magic, nome adornato del predicato della query)
+    """
+    query_adn = adornment(query_atom, set())
+    rewritten = []
+    pending = [(query_atom.name, query_adn)]
+    done = set()
+
+    while pending:
+        name, adn = pending.pop()
+        if (name, adn) in done:
+            continue
+        done.add((name, adn))
+
+        for rule in rules[name]:
+            head_magic = Atom(magic_name(name, adn), bound_args(rule.head, adn))
+            bound = {arg for arg in bound_args(rule.head, adn) if isinstance(arg, Var)}
+            new_body = [head_magic]
+            for atom in order(rule.body, bound):
+                if atom.name in rules:
+                    body_adn = adornment(atom, bound)
+                    pending.append((atom.name, body_adn))
+                    # Regola magic: i binding disponibili prima dell'atomo diventano richieste
+                    rewritten.append(Clause(Atom(magic_name(atom.name, body_adn), bound_args(atom, body_adn)),
+                                            list(new_body)))
+                    new_body.append(Atom(adorned_name(atom.name, body_adn), atom.args))
+                else:
+                    new_body.append(atom)
+                if atom.name not in COMPARISONS:
+                    bound.update(arg for arg in atom.args if isinstance(arg, Var))
+            rewritten.append(Clause(Atom(adorned_name(name, adn), rule.head.args), new_body))
+
+    seed = Atom(magic_name(query_atom.name, query_adn), bound_args(query_atom, query_adn))
+    return rewritten, seed, adorned_name(query_atom.name, query_adn)
+
+
+class JoinStep:
+    """
+    Passo di un piano di join compilato: un atomo con gli argomenti già classificati
+    (costanti, variabili legate dai passi precedenti, variabili nuove) o un confronto
+    """
+
+    def __init__(self, atom, slots, bound, derived, scan=None):
+        """
+        atom: atomo del passo
+        slots: dizionario variabile -> posizione nel vettore dei binding
+        bound: variabili legate prima del passo (aggiornato con quelle legate dal passo)
+        derived: se True l'atomo è letto da una relazione derivata, altrimenti dagli indici della KB
+        scan: (posizione, limiti) della scansione per intervallo della KB, se utilizzabile
+        """
+        self.atom = atom
+        self.name = atom.name
+        self.comparison = COMPARISONS.get(atom.name)
+        self.derived = derived
+        self.scan = scan
+        self.checks = []   # (posizione, costante, slot): argomenti legati da confrontare
+        self.assigns = []  # (posizione, slot): variabili legate da questo passo
+        self.repeats = []  # (posizione, slot): variabili ripetute nell'atomo
+        self.args = []     # per i confronti: (costante, slot) per argomento
+        for pos, arg in enumerate(atom.args):
+            if not isinstance(arg, Var):
+                self.checks.append((pos, arg, None))
+                self.args.append((arg, None))
+            elif arg in bound:
+                self.checks.append((pos, None, slots[arg]))
+                self.args.append((None, slots[arg]))
+            else:
+                if arg not in slots:
+                    slots[arg] = len(slots)
+                if any(slot == slots[arg] for _, slot in self.assigns):
+                    self.repeats.append((pos, slots[arg]))
+                else:
+                    self.assigns.append((pos, slots[arg]))
+        if self.comparison is None:
+            bound.update(arg for arg in atom.args if isinstance(arg, Var))
+
+    def values(self, binding):
+        """Valori degli argomenti legati (costanti o variabili già legate) per posizione"""
+        return [(pos, value if slot is None else binding[slot]) for pos, value, slot in self.checks]
+
+
+class MagicEvaluator:
+    """
+    Valutazione bottom-up semi-naive delle query Datalog riscritte con i magic sets.
+
+    I predicati derivati (adornati e magic) sono materializzati in relazioni locali
+    alla query; i fatti di base sono letti dagli indici della KB, per cui il costo di una
+    query con argomenti legati è proporzionale ai soli fatti raggiungibili da quei valori.
+    I corpi delle regole sono ordinati una volta per query con le stime della KB e ogni
+    regola è compilata in piani di join fissi (uno per atomo derivato da cui partono le
+    delta), eseguiti su un vettore di binding senza ripetere la scelta dell'atomo a ogni tupla.
+    """
+
+    def __init__(self, kb):
+        """
+        kb: istanza di lib.logicRelation.KB (le regole sono lette alla costruzione)
+        """
+        self.kb = kb
+        self.rules = defaultdict(list)
+        for name, clauses in kb.atom_to_clauses.items():
+            for clause in clauses:
+                if clause.body:
+                    self.rules[name].append(clause)
+            if name in self.rules and len(self.rules[name]) < len(clauses):
+                raise ValueError(f"Il predicato {name} ha sia fatti che regole")
+
+    def ask_all(self, query, magic=True):
+        """
+        Risponde alla query (lista di atomi) con la riscrittura magic sets
+
+        Args:
+            query: lista di atomi
+            magic: se False le regole originali sono valutate bottom-up fino al punto fisso
+                   (materializzazione completa di tutti i predicati derivati, per confronto)
+
+        Returns:
+            Lista di dizionari {variabile: valore}, come KB.ask_all (senza duplicati)
+        """
+        qvars = []
+        for atom in query:
+            for arg in atom.args:
+                if isinstance(arg, Var) and arg not in qvars:
+                    qvars.append(arg)
+        query_atom = Atom(QUERY, qvars)
+        rules = defaultdict(list, self.rules)
+        rules[QUERY] = [Clause(query_atom, list(query))]
+
+        if magic:
+            rewritten, seed, answer_name = magic_rewrite(rules, query_atom, self.order)
+            relations = self.evaluate(rewritten, seed)
+        else:
+            relations = self.evaluate([rule for clauses in rules.values() for rule in clauses])
+            answer_name = QUERY
+        answers = relations.get(answer_name, ())
+        return [dict(zip(qvars, t)) for t in answers]
+
+    def order(self, body, bound, derived=None):
+        """
+        Ordina gli atomi di body per la valutazione (strategia di passaggio dei binding):
+        a ogni passo un confronto con gli argomenti legati, altrimenti l'atomo con la
+        stima più bassa date le variabili legate fin lì (bound non viene modificato)
+
+        Args:
+            derived: predicati derivati (default quelli delle regole della KB)
+        """
+        derived = self.rules if derived is None else derived
+        bound = set(bound)
+        remaining = list(body)
+        ordered = []
+        while remaining:
+            best, best_cost = None, None
+            for i, atom in enumerate(remaining):
+                if atom.name in COMPARISONS:
+                    if all(not isinstance(arg, Var) or arg in bound for arg in atom.args):
+                        best = i
+                        break
+                    continue
+                cost = self._estimate(atom, bound, body, derived)
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = i, cost
+            if best is None:
+                raise ValueError(f"Impossibile valutare {[str(a) for a in remaining]}")
+            atom = remaining.pop(best)
+            ordered.append(atom)
+            if atom.name not in COMPARISONS:
+                bound.update(arg for arg in atom.args if isinstance(arg, Var))
+        return ordered
+
+    def _estimate(self, atom, bound, body, derived):
+        """
+        Stima delle tuple di atom date le variabili legate: per i fatti la stima della KB
+        (costanti e intervalli numerici) ridotta della selettività media di ogni argomento
+        legato; per i predicati derivati 1 se chiamati con un argomento legato, altrimenti
+        la stima della KB sulle regole
+        """
+        has_bound = any(not isinstance(arg, Var) or arg in bound for arg in atom.args)
+        if atom.name in derived:
+            if has_bound:
+                return 1
+            return self.kb.estimate(atom) if atom.name in self.kb.atom_to_clauses else 0
+        estimate = self.kb.estimate(atom, body)
+        index = self.kb.arg_index.get(atom.name)
+        if index and len(index) == len(atom.args):
+            for pos, arg in enumerate(atom.args):
+                if isinstance(arg, Var) and arg in bound and index[pos]:
+                    estimate /= len(index[pos])
+        return estimate
+
+    def compile(self, rule, derived, first=None):
+        """
+        Compila il corpo di rule in una lista di JoinStep
+
+        Args:
+            derived: insieme dei predicati derivati
+            first: posizione dell'atomo del corpo da cui partono le delta (valutato per primo)
+
+        Returns:
+            (passi, slot degli argomenti della testa, numero di slot)
+        """
+        slots = {}
+        bound = set()
+        body = list(rule.body)
+        steps = []
+        if first is not None:
+            steps.append(JoinStep(body[first], slots, bound, True))
+            body = body[:first] + body[first + 1:]
+        for atom in self.order(body, bound, derived):
+            scan = None
+            if (atom.name not in derived and atom.name not in COMPARISONS
+                    and all(isinstance(arg, Var) and arg not in bound for arg in atom.args)):
+                # Nessun argomento legato: scansione per intervallo sulle costanti dei confronti, se ce ne sono
+                scan = next(iter(self.kb.range_scans(atom, rule.body)), None)
+            steps.append(JoinStep(atom, slots, bound, atom.name in derived, scan))
+        head = [(arg, None) if not isinstance(arg, Var) else (None, slots[arg]) for arg in rule.head.args]
+        return steps, head, len(slots)
+
+    def evaluate(self, rules, seed=None):
+        """
+        Punto fisso semi-naive delle regole: le regole senza atomi derivati sono valutate
+        una volta, le altre a ogni iterazione a partire dalle tuple nuove (delta) di uno
+        dei loro atomi derivati
+
+        Args:
+            rules: lista di regole
+            seed: fatto iniziale (il seme magic), se presente
+
+        Returns:
+            Dizionario predicato derivato -> Relation
+        """
+        relations = {}
+        derived = {rule.head.name for rule in rules}
+        if seed is not None:
+            derived.add(seed.name)
+
+        # Piani compilati: per ogni regola uno per ogni atomo derivato del corpo
+        initial, by_delta = [], defaultdict(list)
+        for rule in rules:
+            positions = [i for i, atom in enumerate(rule.body) if atom.name in derived]
+            if not positions:
+                initial.append((rule.head.name, self.compile(rule, derived)))
+            for i in positions:
+                by_delta[rule.body[i].name].append((rule.head.name, self.compile(rule, derived, i)))
+
+        new = defaultdict(set)
+        if seed is not None:
+            new[seed.name].add(tuple(seed.args))
+        for name, plan in initial:
+            self._run(plan, None, relations, new[name])
+
+        while new:
+            delta = {}
+            for name, tuples in new.items():
+                relation = relations.get(name)
+                if relation is None:
+                    relation = relations[name] = Relation(name)
+                tuples = tuples - relation.tuples
+                for t in tuples:
+                    relation.add(t)
+                if tuples:
+                    delta[name] = tuples
+            new = defaultdict(set)
+            for name, tuples in delta.items():
+                for head_name, plan in by_delta.get(name, ()):
+                    self._run(plan, tuples, relations, new[head_name])
+            new = {name: tuples for name, tuples in new.items() if tuples}
+        return relations
+
+    def _run(self, plan, delta, relations, out):
+        """Esegue un piano compilato aggiungendo le tuple della testa a out"""
+        steps, head, size = plan
+        binding = [None] * size
+        self._step(steps, 0, binding, delta, relations, head, out)
+
+    def _candidates(self, step, values, delta, relations):
+        """
+        Tuple (o argomenti dei fatti) che possono soddisfare il passo
+        values: valori degli argomenti legati del passo (vedi JoinStep.values)
+        """
+        if delta is not None:
+            return delta
+        if step.derived:
+            relation = relations.get(step.name)
+            if relation is None:
+                return ()
+            if not values:
+                return relation.tuples
+            pattern = [None] * len(step.atom.args)
+            for pos, value in values:
+                pattern[pos] = value
+            return relation.candidates(pattern)
+        kb = self.kb
+        index = kb.arg_index.get(step.name)
+        others = kb.other_clauses.get(step.name)
+        if index and len(index) == len(step.atom.args):
+            best = None
+            for pos, value in values:
+                bucket = index[pos].get(value, ())
+                if best is None or len(bucket) < len(best):
+                    best = bucket
+            if best is None:
+                if step.scan is not None:
+                    pos, bounds = step.scan
+                    best = kb.range_index[step.name][pos].scan(*bounds)
+                else:
+                    best = kb.atom_to_clauses.get(step.name, ())
+                    others = None
+        else:
+            best = kb.atom_to_clauses.get(step.name, ())
+            others = None
+        if others:
+            best = list(best) + others
+        return [clause.head.args for clause in best if not clause.body]
+
+    def _step(self, steps, k, binding, delta, relations, head, out):
+        if k == len(steps):
+            out.add(tuple(value if slot is None else binding[slot] for value, slot in head))
+            return
+        step = steps[k]
+        if step.comparison is not None:
+            args = [value if slot is None else binding[slot] for value, slot in step.args]
+            if step.comparison(*args):
+                self._step(steps, k + 1, binding, delta, relations, head, out)
+            return
+        values = step.values(binding)
+        assigns, repeats = step.assigns, step.repeats
+        for t in self._candidates(step, values, delta if k == 0 else None, relations):
+            if any(t[pos] != value for pos, value in values):
+                continue
+            for pos, slot in assigns:
+                binding[slot] = t[pos]
+            if repeats and any(t[pos] != binding[slot] for pos, slot in repeats):
+                continue
+            self._step(steps, k + 1, binding, delta, relations, head, out)
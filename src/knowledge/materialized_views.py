@@ -0,0 +1,324 @@
+from collections import defaultdict
+from lib.logicRelation import Var, Atom
+
+# Built-in di confronto valutati direttamente quando gli argomenti sono ground
+COMPARISONS = {
+    'lt': lambda a, b: a < b,
+    'le': lambda a, b: a <= b,
+    'between': lambda low, high, x: low <= x <= high,
+}
+
+
+class Relation:
+    """
+    Relazione materializzata: tuple presenti con indice hash per posizione dell'argomento.
+    L'indice è costruito alla prima ricerca con argomenti legati e poi mantenuto, per cui
+    le relazioni lette solo per intero (es. le risposte di una query) non lo pagano.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.tuples = set()
+        self.index = None  # (posizione, valore) -> insieme di tuple, costruito al primo uso
+
+    def __len__(self):
+        return len(self.tuples)
+
+    def __iter__(self):
+        return iter(self.tuples)
+
+    def __contains__(self, t):
+        return t in self.tuples
+
+    def add(self, t):
+        self.tuples.add(t)
+        if self.index is not None:
+            for pos, value in enumerate(t):
+                self.index[(pos, value)].add(t)
+
+    def discard(self, t):
+        self.tuples.discard(t)
+        if self.index is None:
+            return
+        for pos, value in enumerate(t):
+            bucket = self.index.get((pos, value))
+            if bucket is not None:
+                bucket.discard(t)
+                if not bucket:
+                    del self.index[(pos, value)]
+
+    def candidates(self, pattern):
+        """
+        Restituisce le tuple compatibili con il pattern
+        pattern: tupla con il valore per le posizioni legate e None per quelle libere
+        """
+        bound = [(pos, value) for pos, value in enumerate(pattern) if value is not None]
+        if not bound:
+            return self.tuples
+        if self.index is None:
+            self.index = defaultdict(set)
+            for t in self.tuples:
+                for pos, value in enumerate(t):
+                    self.index[(pos, value)].add(t)
+        # Usa il bucket più piccolo tra le posizioni legate
+        buckets = [self.index.get(key, ()) for key in bound]
+        smallest = min(buckets, key=len)
+        return [t for t in smallest if all(t[pos] == value for pos, value in bound)]
+
+
+class MaterializedViews:
+    """
+    Viste materializzate dei predicati derivati di una KB Datalog non ricorsiva.
+
+    Ogni tupla derivata mantiene il numero delle sue derivazioni (algoritmo di counting):
+    inserimenti e cancellazioni dei fatti di base vengono propagati con regole delta,
+    per cui il costo di un aggiornamento è proporzionale alle sue conseguenze.
+    """
+
+    def __init__(self, kb):
+        """
+        Costruisce le viste a partire dai fatti e dalle regole della KB
+        kb: istanza di lib.logicRelation.KB
+        """
+        self.rules = defaultdict(list)  # predicato derivato -> regole
+        self.base_counts = defaultdict(dict)  # molteplicità dei fatti di base
+        self.derivations = defaultdict(dict)  # numero di derivazioni delle tuple derivate
+        self.relations = {}
+
+        facts = []
+        for name, clauses in kb.atom_to_clauses.items():
+            for clause in clauses:
+                if clause.body:
+                    self._check_rule(clause)
+                    self.rules[name].append(clause)
+                else:
+                    facts.append(clause.head)
+
+        for atom in facts:
+            if atom.name in self.rules:
+                raise ValueError(f"Il predicato {atom.name} ha sia fatti che regole")
+            t = self._ground_tuple(atom)
+            counts = self.base_counts[atom.name]
+            counts[t] = counts.get(t, 0) + 1
+            self._relation(atom.name).add(t)
+
+        # Ordine topologico dei predicati derivati (strati)
+        self.order = self._topological_order()
+
+        # Materializzazione iniziale
+        for name in self.order:
+            relation = self._relation(name)
+            counts = self.derivations[name]
+            for rule in self.rules[name]:
+                for binding in self._join(list(enumerate(rule.body)), {}, {}, None):
+                    head = self._instantiate(rule.head, binding)
+                    counts[head] = counts.get(head, 0) + 1
+            for t in counts:
+                relation.add(t)
+
+    def _relation(self, name):
+        if name not in self.relations:
+            self.relations[name] = Relation(name)
+        return self.relations[name]
+
+    def _check_rule(self, clause):
+        """Verifica che la regola sia Datalog sicura (senza simboli di funzione)"""
+        body_vars = set()
+        for atom in [clause.head] + clause.body:
+            for arg in atom.args:
+                if isinstance(arg, Atom):
+                    raise ValueError(f"Simboli di funzione non supportati nelle viste: {clause}")
+        for atom in clause.body:
+            if atom.name not in COMPARISONS:
+                body_vars.update(arg for arg in atom.args if isinstance(arg, Var))
+        for arg in clause.head.args:
+            if isinstance(arg, Var) and arg not in body_vars:
+                raise ValueError(f"Regola non sicura: {clause}")
+
+    def check_fact(self, atom):
+        """Verifica che atom sia un fatto di base ground (ValueError altrimenti)"""
+        if atom.name in self.rules:
+            raise ValueError(f"{atom.name} è un predicato derivato")
+        self._ground_tuple(atom)
+
+    def _ground_tuple(self, atom):
+        if any(isinstance(arg, (Var, Atom)) for arg in atom.args):
+            raise ValueError(f"Il fatto {atom} non è ground")
+        return tuple(atom.args)
+
+    def _topological_order(self):
+        order = []
+        state = {}
+
+        def visit(name):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"Regole ricorsive non supportate dalle viste materializzate ({name})")
+            state[name] = 'visiting'
+            for rule in self.rules[name]:
+                for atom in rule.body:
+                    if atom.name in self.rules:
+                        visit(atom.name)
+            state[name] = 'done'
+            order.append(name)
+
+        for name in list(self.rules):
+            visit(name)
+        return order
+
+    @staticmethod
+    def _instantiate(atom, binding):
+        return tuple(binding.get(arg, arg) if isinstance(arg, Var) else arg for arg in atom.args)
+
+    @staticmethod
+    def _match(atom, t, binding):
+        """Estende binding unificando gli argomenti di atom con la tupla t (None se fallisce)"""
+        new_binding = binding
+        for arg, value in zip(atom.args, t):
+            if isinstance(arg, Var):
+                if arg in new_binding:
+                    if new_binding[arg] != value:
+                        return None
+                else:
+                    if new_binding is binding:
+                        new_binding = dict(binding)
+                    new_binding[arg] = value
+            elif arg != value:
+                return None
+        return new_binding
+
+    def _lookup(self, atom, binding, old, delta):
+        """
+        Tuple di atom compatibili con binding
+        old: se True usa lo stato precedente all'aggiornamento corrente,
+             ricostruito dallo stato nuovo e dalle delta
+        """
+        relation = self.relations.get(atom.name)
+        pattern = tuple(binding.get(arg) if isinstance(arg, Var) else arg for arg in atom.args)
+        current = relation.candidates(pattern) if relation is not None else ()
+        changes = delta.get(atom.name)
+        if not old or not changes:
+            return current
+        result = [t for t in current if changes.get(t, 0) <= 0]
+        for t, sign in changes.items():
+            if sign < 0 and all(p is None or p == v for p, v in zip(pattern, t)):
+                result.append(t)
+        return result
+
+    def _join(self, body, binding, delta, old_from):
+        """
+        Genera i binding che soddisfano tutti gli atomi di body
+        body: lista di coppie (posizione nella regola, atomo)
+        old_from: gli atomi con posizione >= old_from sono valutati nello stato precedente
+        """
+        if not body:
+            yield binding
+            return
+        # Scegli un confronto ground se presente, altrimenti l'atomo con più argomenti legati
+        best = None
+        best_score = None
+        for i, (pos, atom) in enumerate(body):
+            if atom.name in COMPARISONS:
+                if all(not isinstance(a, Var) or a in binding for a in atom.args):
+                    best = i
+                    break
+                continue
+            score = sum(1 for a in atom.args if not isinstance(a, Var) or a in binding)
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+        if best is None:
+            raise ValueError(f"Impossibile valutare {[str(a) for _, a in body]}")
+        pos, atom = body[best]
+        remaining = body[:best] + body[best + 1:]
+        if atom.name in COMPARISONS:
+            args = [binding.get(a, a) if isinstance(a, Var) else a for a in atom.args]
+            if COMPARISONS[atom.name](*args):
+                yield from self._join(remaining, binding, delta, old_from)
+            return
+        old = old_from is not None and pos >= old_from
+        for t in self._lookup(atom, binding, old, delta):
+            new_binding = self._match(atom, t, binding)
+            if new_binding is not None:
+                yield from self._join(remaining, new_binding, delta, old_from)
+
+    def answers(self, name):
+        """Restituisce l'insieme delle tuple della relazione name"""
+        relation = self.relations.get(name)
+        return set(relation.tuples) if relation is not None else set()
+
+    def count(self, atom):
+        """Numero di derivazioni (o molteplicità, per i fatti di base) della tupla atom"""
+        t = self._ground_tuple(atom)
+        if atom.name in self.rules:
+            return self.derivations[atom.name].get(t, 0)
+        return self.base_counts[atom.name].get(t, 0)
+
+    def update(self, added=(), removed=()):
+        """
+        Applica un insieme di modifiche ai fatti di base e le propaga alle viste
+        added, removed: liste di atomi ground
+        Restituisce un dizionario predicato -> {tupla: +1/-1} con le tuple comparse o scomparse
+        """
+        # Tutti gli atomi sono verificati prima di modificare le viste
+        for atom in list(removed) + list(added):
+            self.check_fact(atom)
+
+        delta = defaultdict(dict)
+        for atoms, sign in ((removed, -1), (added, +1)):
+            for atom in atoms:
+                t = self._ground_tuple(atom)
+                counts = self.base_counts[atom.name]
+                before = counts.get(t, 0)
+                if sign < 0 and before == 0:
+                    continue
+                counts[t] = before + sign
+                if counts[t] == 0:
+                    del counts[t]
+                if (before > 0) != (counts.get(t, 0) > 0):
+                    # Una cancellazione seguita da un reinserimento si annulla
+                    if delta[atom.name].pop(t, None) is None:
+                        delta[atom.name][t] = sign
+
+        # Porta le relazioni di base nello stato nuovo
+        for name, changes in delta.items():
+            relation = self._relation(name)
+            for t, sign in changes.items():
+                if sign > 0:
+                    relation.add(t)
+                else:
+                    relation.discard(t)
+
+        # Propaga strato per strato con le regole delta
+        for name in self.order:
+            changed = defaultdict(int)
+            for rule in self.rules[name]:
+                body = list(enumerate(rule.body))
+                for i, atom in body:
+                    changes = delta.get(atom.name)
+                    if not changes:
+                        continue
+                    # Gli atomi prima di i vedono lo stato nuovo, quelli dopo lo stato precedente
+                    remaining = body[:i] + body[i + 1:]
+                    for t, sign in changes.items():
+                        binding = self._match(atom, t, {})
+                        if binding is None:
+                            continue
+                        for solution in self._join(remaining, binding, delta, i + 1):
+                            changed[self._instantiate(rule.head, solution)] += sign
+            relation = self._relation(name)
+            counts = self.derivations[name]
+            for t, diff in changed.items():
+                if diff == 0:
+                    continue
+                before = counts.get(t, 0)
+                counts[t] = before + diff
+                if counts[t] == 0:
+                    del counts[t]
+                    relation.discard(t)
+                    delta[name][t] = -1
+                elif before == 0:
+                    relation.add(t)
+                    delta[name][t] = +1
+
+        return {name: changes for name, changes in delta.items() if changes}
@@ -1,126 +1,586 @@
-from lib.logicRelation import KB, Var, Atom, Clause, unify, apply
-from src.data.data_manager import load_attractions, load_tourists, get_all_attractions_list, get_tourist_profile, \
-    get_attraction_details
-from geopy.distance import geodesic
+import pandas as pd
+from lib.logicRelation import KB, Var, Atom, Clause, unify, apply, term_key
+from src.data.data_manager import get_all_attractions_list, get_tourist_profile, invalidate_index
+from src.data.data_context import default_context
+from src.data.sqlite_store import is_fresh as database_is_fresh
+from src.knowledge.materialized_views import MaterializedViews
+from src.knowledge.columnar_store import ColumnarFactStore
+from src.knowledge.magic_sets import MagicEvaluator
+from src.knowledge.text_index import TrigramIndex
+from src.knowledge.attraction_arrays import AttractionArrays
+from src.knowledge.kb_snapshot import snapshot_key, read_snapshot, write_snapshot
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+# Categorie riconosciute nelle descrizioni delle attrazioni e nei profili dei turisti
+CATEGORIES = ['arte', 'storia', 'natura', 'divertimento']
+
+# Soglia di costo (esclusa) delle attrazioni economiche (regola budget_friendly)
+BUDGET_MAX_COST = 15.0
+
+# Mappatura flessibile degli interessi a termini di ricerca
+INTEREST_TERMS = {
+    'arte': ['arte', 'museo', 'galleria', 'cappella', 'basilica'],
+    'storia': ['storia', 'antico', 'storico', 'romano', 'imperiale', 'foro', 'rovina'],
+    'natura': ['natura', 'villa', 'parco', 'giardino', 'verde'],
+    'divertimento': ['divertimento', 'svago', 'parco', 'world', 'bambini']
+}
+
+
+def datalog_rules():
+    """Restituisce le regole Datalog del sistema turistico"""
+    # Variabili Datalog
+    X = Var('X')
+    Y = Var('Y')
+    Z = Var('Z')
+    Cost = Var('Cost')
+    Rating = Var('Rating')
+
+    return [
+        # Un'attrazione è considerata di alto rating se rating >= 4
+        Clause(
+            Atom('high_rated', [X]),
+            [Atom('attraction', [X]), Atom('has_rating', [X, Rating]), Atom('lt', [4.0, Rating])]
+        ),
 
+        # Un'attrazione è economica se costo <= 15
+        Clause(
+            Atom('budget_friendly', [X]),
+            [Atom('attraction', [X]), Atom('has_cost', [X, Cost]), Atom('lt', [Cost, BUDGET_MAX_COST])]
+        ),
 
-class DatalogReasoner:
-    """Reasoner basato su Datalog per il sistema turistico"""
+        # Un'attrazione è consigliata se ha un buon rating e un costo contenuto
+        Clause(
+            Atom('recommended', [X]),
+            [Atom('attraction', [X]), Atom('high_rated', [X]), Atom('budget_friendly', [X])]
+        ),
 
-    def __init__(self):
-        """Inizializza il reasoner Datalog"""
-        # Crea la knowledge base
-        self.kb = KB([])
+        # Un'attrazione è adatta a un turista se ha una categoria che piace al turista
+        Clause(
+            Atom('suitable_for', [X, Z]),
+            [Atom('attraction', [X]), Atom('tourist_likes', [Z, Y]), Atom('has_category', [X, Y])]
+        )
+    ]
+
+
+class AttractionInfo(Mapping):
+    """
+    Record immutabile di un'attrazione, nel formato degli individui dell'ontologia.
+    I record sono creati una sola volta e condivisi da tutte le ricerche;
+    le colonne del dataset restano accessibili come in un dizionario in sola lettura
+    (record['nome'], 'nome' in record, record.items(), dict(record)).
+    """
+    __slots__ = ('id', 'name', 'hasLatitude', 'hasLongitude', 'hasEstimatedVisitTime',
+                 'hasAverageRating', 'hasCategory', '_details')
+
+    def __init__(self, details):
+        description = details['descrizione'].lower()
+        values = {
+            'id': str(details['id_attrazione']),
+            'name': details['nome'],
+            'hasLatitude': (details['latitudine'],),
+            'hasLongitude': (details['longitudine'],),
+            'hasEstimatedVisitTime': (details['tempo_visita'],),
+            'hasAverageRating': (details['recensione_media'],),
+            # Categorie in base alla descrizione
+            'hasCategory': tuple(category for category in CATEGORIES if category in description),
+            '_details': dict(details)
+        }
+        for slot, value in values.items():
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AttractionInfo è immutabile")
+
+    def __reduce__(self):
+        return AttractionInfo, (self._details,)
+
+    def __getitem__(self, column):
+        return self._details[column]
+
+    def __iter__(self):
+        return iter(self._details)
+
+    def __len__(self):
+        return len(self._details)
+
+    def __contains__(self, column):
+        return column in self._details
+
+    def __hash__(self):
+        # Record uguali hanno le stesse colonne, quindi lo stesso ID
+        return hash(self.id)
+
+    def get(self, column, default=None):
+        return self._details.get(column, default)
+
+    def to_dict(self):
+        """Restituisce una copia modificabile delle colonne del dataset"""
+        return dict(self._details)
+
+    def __repr__(self):
+        return f"AttractionInfo({self.id}, {self.name!r})"
+
+
+class AttractionClass:
+    """
+    Classe Attraction dell'ontologia simulata: l'elenco delle istanze e l'indice
+    per categoria sono calcolati alla prima richiesta e riusati fino a una modifica
+    """
+
+    def __init__(self, reasoner):
+        self.reasoner = reasoner
+        self._instances = None
+        self._positions = None
+        self._by_category = None
+
+    def invalidate(self):
+        """Scarta elenco e indice (da chiamare quando cambiano le attrazioni)"""
+        self._instances = None
+        self._positions = None
+        self._by_category = None
+
+    def instances(self):
+        """Restituisce tutte le istanze di attrazioni (tupla condivisa)"""
+        if self._instances is None:
+            self._instances = tuple(self.reasoner.attractions_by_id.values())
+            self._positions = {record.id: i for i, record in enumerate(self._instances)}
+        return self._instances
+
+    def instances_with_category(self, category):
+        """Restituisce le istanze di una categoria con una ricerca nell'indice"""
+        if self._by_category is None:
+            index = {}
+            for record in self.instances():
+                for record_category in record.hasCategory:
+                    index.setdefault(record_category, []).append(record)
+            self._by_category = {key: tuple(records) for key, records in index.items()}
+        return self._by_category.get(category, ())
+
+    def instances_with_categories(self, categories):
+        """
+        Restituisce le istanze con almeno una delle categorie indicate,
+        nell'ordine di instances() e senza duplicati
+        """
+        selected = {}
+        for category in categories:
+            for record in self.instances_with_category(category):
+                selected[record.id] = record
+        return sorted(selected.values(), key=lambda record: self._positions[record.id])
 
-        # Carica i dati
-        attractions_df = load_attractions()
-        self.attractions_df = attractions_df  # Salva il DataFrame per usi futuri
-        attractions_list = get_all_attractions_list(attractions_df)
 
-        # Variabili Datalog
-        X = Var('X')
-        Y = Var('Y')
-        Z = Var('Z')
-        Cost = Var('Cost')
-        Rating = Var('Rating')
+class Ontology:
+    """Facciata persistente che simula l'ontologia usata dai moduli di pianificazione e apprendimento"""
 
-        # Aggiungi fatti alla knowledge base
-        for attr in attractions_list:
-            attr_id = str(attr['id_attrazione'])
+    def __init__(self, reasoner):
+        self.reasoner = reasoner
+        self.Attraction = AttractionClass(reasoner)
 
-            # Aggiungi fatto: attraction(attr_id)
-            self.kb.add_clause(Clause(Atom('attraction', [attr_id])))
+    def search_one(self, iri=None):
+        """
+        Delega la ricerca al reasoner
+        """
+        return self.reasoner.search_one(iri)
 
-            # Aggiungi fatto: has_cost(attr_id, cost)
-            self.kb.add_clause(Clause(Atom('has_cost', [attr_id, attr['costo']])))
 
-            # Aggiungi fatto: has_rating(attr_id, rating)
-            self.kb.add_clause(Clause(Atom('has_rating', [attr_id, attr['recensione_media']])))
+def _suitable_by_tourist(kb):
+    """
+    Valuta suitable_for(X, Z) con il turista non legato in un'unica interrogazione
+    e raggruppa le attrazioni per turista (senza duplicati)
+    """
+    X = Var('X')
+    Z = Var('Z')
+    query = [Atom('suitable_for', [X, Z])]
+    if isinstance(kb, ColumnarFactStore):
+        frame = kb.ask_frame(query).drop_duplicates()
+        return frame.groupby('Z', sort=False)['X'].agg(list).to_dict()
 
-            # Aggiungi fatto: has_location(attr_id, lat, lon)
-            self.kb.add_clause(Clause(Atom('has_location', [attr_id, attr['latitudine'], attr['longitudine']])))
+    grouped = {}
+    for answer in kb.ask_all(query):
+        grouped.setdefault(answer[Z], {})[answer[X]] = None
+    return {tourist: list(attractions) for tourist, attractions in grouped.items()}
 
-            # Aggiungi categorie in base alla descrizione
-            if 'arte' in attr['descrizione'].lower():
-                self.kb.add_clause(Clause(Atom('has_category', [attr_id, 'arte'])))
-            if 'storia' in attr['descrizione'].lower():
-                self.kb.add_clause(Clause(Atom('has_category', [attr_id, 'storia'])))
-            if 'natura' in attr['descrizione'].lower():
-                self.kb.add_clause(Clause(Atom('has_category', [attr_id, 'natura'])))
-            if 'divertimento' in attr['descrizione'].lower():
-                self.kb.add_clause(Clause(Atom('has_category', [attr_id, 'divertimento'])))
 
-        # Aggiungi regole
+class DatalogReasoner:
+    """Reasoner basato su Datalog per il sistema turistico"""
 
-        # Un'attrazione è considerata di alto rating se rating >= 4
-        self.kb.add_clause(Clause(
-            Atom('high_rated', [X]),
-            [Atom('attraction', [X]), Atom('has_rating', [X, Rating]), Atom('lt', [4.0, Rating])]
-        ))
+    def __init__(self, store='kb', context=None):
+        """
+        Inizializza il reasoner Datalog
 
-        # Un'attrazione è economica se costo <= 15
-        self.kb.add_clause(Clause(
-            Atom('budget_friendly', [X]),
-            [Atom('attraction', [X]), Atom('has_cost', [X, Cost]), Atom('lt', [Cost, 15.0])]
-        ))
+        Args:
+            store: 'kb' per la knowledge base a clausole con viste materializzate,
+                   'columnar' per i fatti in colonne pandas valutati con join vettoriali
+            context: DataContext da cui leggere i dati (default quello condiviso dal processo)
+        """
+        if store not in ('kb', 'columnar'):
+            raise ValueError(f"Tipo di store non valido: {store}")
+        self.store = store
+        self.context = context or default_context()
+        self._owns_attractions = False  # True dopo la copia del DataFrame condiviso (vedi update_attraction)
+        self._magic = None  # valutatore magic sets, creato alla prima query
+        self._arrays = None  # colonne NumPy per i filtri vettoriali, create al primo uso
+        self.database = None  # SQLiteStore a cui delegare i filtri (vedi use_database)
+
+        # Dati dal contesto condiviso (letti una sola volta per processo)
+        attractions_df = self.context.attractions
+        self.attractions_df = attractions_df
+
+        # Tabelle di lookup id -> record e nome -> record
+        self.attractions_by_id = {}
+        self.attractions_by_name = {}
+        if attractions_df is not None:
+            for details in attractions_df.to_dict('records'):
+                self._add_record(AttractionInfo(details))
+
+        # Facciata dell'ontologia con istanze e indice per categoria
+        self._onto = Ontology(self)
+
+        # Indice di trigrammi su nome e descrizione per la ricerca per interessi
+        self.text_index = TrigramIndex()
+        self._interest_matches = {}  # interesse -> ID delle attrazioni corrispondenti
+        if attractions_df is not None:
+            for attr_id, name, description in zip(attractions_df['id_attrazione'], attractions_df['nome'],
+                                                  attractions_df['descrizione']):
+                self.text_index.add(str(attr_id), description, name)
+
+        if store == 'columnar':
+            # I fatti sono costruiti direttamente dalle colonne, senza clausole per riga
+            self.tourists_df = self.context.tourists
+            self.kb = ColumnarFactStore(attractions_df, self.tourists_df, datalog_rules(), CATEGORIES)
+            self.views = None
+            return
 
-        # Un'attrazione è consigliata se ha un buon rating e un costo contenuto
-        self.kb.add_clause(Clause(
-            Atom('recommended', [X]),
-            [Atom('attraction', [X]), Atom('high_rated', [X]), Atom('budget_friendly', [X])]
-        ))
+        # Crea la knowledge base
+        self.kb = KB([])
+        attractions_list = get_all_attractions_list(attractions_df)
 
-        # Un'attrazione è adatta a un turista se ha una categoria che piace al turista
-        self.kb.add_clause(Clause(
-            Atom('suitable_for', [X, Z]),
-            [Atom('attraction', [X]), Atom('tourist_likes', [Z, Y]), Atom('has_category', [X, Y])]
-        ))
+        # Aggiungi fatti alla knowledge base
+        for attr in attractions_list:
+            for atom in self._attraction_facts(attr):
+                self.kb.add_clause(Clause(atom))
+
+        # Aggiungi regole
+        for rule in datalog_rules():
+            self.kb.add_clause(rule)
 
         # Carica i dati dei turisti
         self._load_tourist_data()
 
+        # Materializza i predicati derivati per la manutenzione incrementale
+        self.views = MaterializedViews(self.kb)
+
+    @classmethod
+    def load(cls, store='kb', use_snapshot=True, snapshot_dir=None, context=None, name=None):
+        """
+        Restituisce un reasoner pronto all'uso riutilizzando lo snapshot su disco
+        (fatti, indici e viste materializzate) se i CSV e le regole non sono cambiati;
+        altrimenti lo costruisce da zero e aggiorna lo snapshot
+
+        Args:
+            store: tipo di store ('kb' o 'columnar')
+            use_snapshot: se False ricostruisce sempre il reasoner (lo snapshot viene comunque aggiornato)
+            snapshot_dir: directory degli snapshot (default datasets/.cache)
+            context: DataContext da cui leggere i dati (default quello condiviso dal processo)
+            name: nome logico dello snapshot (default reasoner_<store>); dataset diversi
+                  devono usare nomi diversi, perché ogni scrittura rimuove gli snapshot con lo stesso nome
+        """
+        context = context or default_context()
+        name = name or f"reasoner_{store}"
+        key = snapshot_key([context.paths['attractions'], context.paths['tourists']], datalog_rules(), CATEGORIES,
+                           store)
+        if use_snapshot:
+            reasoner = read_snapshot(name, key, snapshot_dir)
+            if reasoner is not None:
+                print("Reasoner caricato dallo snapshot")
+                reasoner._attach(context)
+                return reasoner
+
+        reasoner = cls(store=store, context=context)
+        if store == 'kb':
+            reasoner.kb.cache_clear()
+        write_snapshot(reasoner, name, key, snapshot_dir)
+        return reasoner
+
+    def _attach(self, context):
+        """
+        Collega un reasoner letto da uno snapshot al contesto: il contesto riceve i DataFrame
+        dello snapshot se non li ha ancora letti, altrimenti il reasoner usa quelli del contesto
+        (lo snapshot è valido solo se i CSV non sono cambiati, per cui il contenuto coincide)
+        """
+        context.adopt(attractions=self.attractions_df, tourists=self.tourists_df)
+        self.context = context
+        self.attractions_df = context.attractions
+        self.tourists_df = context.tourists
+        self._owns_attractions = False
+        self._arrays = None
+        self.database = None
+
     def _load_tourist_data(self):
         """Carica i dati dei turisti nella knowledge base"""
-        # Carica i dati dei turisti
-        tourists_df = load_tourists()
-        self.tourists_df = tourists_df  # Salva il DataFrame per usi futuri
+        tourists_df = self.context.tourists
+        self.tourists_df = tourists_df
 
         if tourists_df is not None:
             for _, row in tourists_df.iterrows():
-                tourist_id = str(row['id_turista'])
+                for atom in self._tourist_facts(row):
+                    self.kb.add_clause(Clause(atom))
+
+    def _add_record(self, record):
+        """Registra un record nelle tabelle di lookup (a parità di nome vale il primo)"""
+        old = self.attractions_by_id.get(record.id)
+        if old is not None and self.attractions_by_name.get(old.name) is old:
+            del self.attractions_by_name[old.name]
+        self.attractions_by_id[record.id] = record
+        self.attractions_by_name.setdefault(record.name, record)
+
+    @staticmethod
+    def _attraction_facts(attr):
+        """Restituisce i fatti Datalog che descrivono un'attrazione"""
+        attr_id = str(attr['id_attrazione'])
+        facts = [
+            Atom('attraction', [attr_id]),
+            Atom('has_cost', [attr_id, attr['costo']]),
+            Atom('has_rating', [attr_id, attr['recensione_media']]),
+            Atom('has_location', [attr_id, attr['latitudine'], attr['longitudine']])
+        ]
+
+        # Aggiungi categorie in base alla descrizione
+        description = attr['descrizione'].lower()
+        for category in CATEGORIES:
+            if category in description:
+                facts.append(Atom('has_category', [attr_id, category]))
+        return facts
+
+    @staticmethod
+    def _tourist_facts(profile):
+        """Restituisce i fatti Datalog con gli interessi di un turista"""
+        tourist_id = str(profile['id_turista'])
+
+        # Aggiungi interessi basati sui punteggi (soglia per considerare un interesse rilevante)
+        return [Atom('tourist_likes', [tourist_id, category])
+                for category in CATEGORIES if profile[category] > 5]
+
+    def add_fact(self, atom):
+        """
+        Aggiunge un fatto alla knowledge base e aggiorna in modo incrementale
+        le viste materializzate dei predicati derivati
+
+        Returns:
+            Dizionario predicato -> {tupla: +1/-1} con le tuple derivate comparse o scomparse
+            (None con lo store colonnare, che non materializza i predicati derivati)
+
+        Raises:
+            ValueError: se atom non è ground o è un predicato derivato (la KB non viene modificata)
+        """
+        if self.views is not None:
+            self.views.check_fact(atom)
+        self.kb.add_clause(Clause(atom))
+        if self.views is None:
+            return None
+        return self.views.update(added=[atom])
+
+    def retract_fact(self, atom):
+        """
+        Rimuove un fatto dalla knowledge base e propaga la cancellazione alle viste materializzate
 
-                # Aggiungi interessi basati sui punteggi
-                if row['arte'] > 5:  # Soglia per considerare un interesse rilevante
-                    self.kb.add_clause(Clause(Atom('tourist_likes', [tourist_id, 'arte'])))
+        Returns:
+            Dizionario delle modifiche alle viste, o None se il fatto non era presente
 
-                if row['storia'] > 5:
-                    self.kb.add_clause(Clause(Atom('tourist_likes', [tourist_id, 'storia'])))
+        Raises:
+            ValueError: se atom non è ground o è un predicato derivato (la KB non viene modificata)
+        """
+        if self.views is not None:
+            self.views.check_fact(atom)
+        if not self.kb.remove_clause(Clause(atom)) or self.views is None:
+            return None
+        return self.views.update(removed=[atom])
 
-                if row['natura'] > 5:
-                    self.kb.add_clause(Clause(Atom('tourist_likes', [tourist_id, 'natura'])))
+    def update_attraction(self, attraction_id, **fields):
+        """
+        Aggiorna (o aggiunge) un'attrazione senza ricostruire la knowledge base.
+        Vengono ritirati solo i fatti cambiati e le modifiche sono propagate alle viste.
 
-                if row['divertimento'] > 5:
-                    self.kb.add_clause(Clause(Atom('tourist_likes', [tourist_id, 'divertimento'])))
+        Args:
+            attraction_id: ID dell'attrazione
+            fields: colonne del dataset da aggiornare (es. recensione_media=4.2)
+
+        Returns:
+            Dizionario predicato -> {tupla: +1/-1} con le modifiche a fatti e viste
+            (None con lo store colonnare)
+        """
+        unknown = set(fields) - set(self.attractions_df.columns)
+        if unknown:
+            raise ValueError(f"Colonne sconosciute: {sorted(unknown)}")
+
+        if not self._owns_attractions:
+            # Il DataFrame è condiviso tramite il contesto: le modifiche vanno su una copia privata
+            self.attractions_df = self.attractions_df.copy()
+            self._owns_attractions = True
+
+        numeric_id = int(attraction_id)
+        mask = self.attractions_df['id_attrazione'] == numeric_id
+        if mask.any():
+            old_record = self.attractions_df[mask].iloc[0].to_dict()
+            for column, value in fields.items():
+                self.attractions_df.loc[mask, column] = value
+            new_record = dict(old_record, **fields)
+            old_facts = self._attraction_facts(old_record)
+        else:
+            new_record = dict(fields, id_attrazione=numeric_id)
+            missing = set(self.attractions_df.columns) - set(new_record)
+            if missing:
+                raise ValueError(f"Nuova attrazione {numeric_id}: colonne mancanti {sorted(missing)}")
+            # Riga accodata con concat: l'indice del DataFrame può non essere 0..n-1 (es. dopo un filtro)
+            row = pd.DataFrame([new_record], columns=self.attractions_df.columns)
+            self.attractions_df = pd.concat([self.attractions_df, row], ignore_index=True)
+            old_facts = []
+        invalidate_index(self.attractions_df)
+
+        self._add_record(AttractionInfo(new_record))
+        self._onto.Attraction.invalidate()
+        self._arrays = None
+        # Il database riflette il CSV e non le modifiche in memoria: i filtri tornano ai DataFrame
+        self.database = None
+        if not old_facts or 'nome' in fields or 'descrizione' in fields:
+            self.text_index.add(str(numeric_id), new_record['descrizione'], new_record['nome'])
+            self._interest_matches.clear()
+
+        # Calcola la differenza tra i vecchi e i nuovi fatti
+        new_facts = self._attraction_facts(new_record)
+        old_keys = [term_key(atom) for atom in old_facts]
+        new_keys = [term_key(atom) for atom in new_facts]
+        removed = [atom for atom, key in zip(old_facts, old_keys) if key not in new_keys]
+        added = [atom for atom, key in zip(new_facts, new_keys) if key not in old_keys]
+
+        for atom in removed:
+            self.kb.remove_clause(Clause(atom))
+        for atom in added:
+            self.kb.add_clause(Clause(atom))
+        if self.views is None:
+            return None
+        return self.views.update(added=added, removed=removed)
+
+    def _in_dataset_order(self, predicate):
+        """
+        Attrazioni X con predicate(X) nell'ordine del dataset: l'ordine delle risposte
+        della KB dipende dal piano scelto (es. scansione per intervallo ordinata per valore)
+        """
+        X = Var('X')
+        found = {result[X] for result in self.kb.ask_all([Atom(predicate, [X])])}
+        return [attr_id for attr_id in self.attractions_by_id if attr_id in found]
 
     def find_high_rated_attractions(self):
-        """Trova attrazioni con valutazione alta"""
-        results = self.kb.ask_all([Atom('high_rated', [Var('X')])])
-        return [result['X'] for result in results]
+        """Trova attrazioni con valutazione alta (nell'ordine del dataset)"""
+        return self._in_dataset_order('high_rated')
 
     def find_budget_friendly_attractions(self):
-        """Trova attrazioni economiche"""
-        results = self.kb.ask_all([Atom('budget_friendly', [Var('X')])])
-        return [result['X'] for result in results]
+        """Trova attrazioni economiche (nell'ordine del dataset, con o senza database)"""
+        if self.database is not None:
+            return [str(attr_id) for attr_id in self.database.cheaper_than(BUDGET_MAX_COST)]
+        return self._in_dataset_order('budget_friendly')
 
     def find_recommended_attractions(self):
-        """Trova attrazioni consigliate (alto rating e budget friendly)"""
-        results = self.kb.ask_all([Atom('recommended', [Var('X')])])
-        return [result['X'] for result in results]
+        """Trova attrazioni consigliate (alto rating e budget friendly, nell'ordine del dataset)"""
+        return self._in_dataset_order('recommended')
 
     def find_suitable_attractions(self, tourist_id):
         """Trova attrazioni adatte a un turista specifico"""
-        results = self.kb.ask_all([Atom('suitable_for', [Var('X'), tourist_id])])
-        return [result['X'] for result in results]
+        X = Var('X')
+        results = self.kb.ask_all([Atom('suitable_for', [X, str(tourist_id)])])
+        return [result[X] for result in results]
+
+    def find_top_rated_attractions(self, n=5):
+        """
+        Trova le n attrazioni con la valutazione più alta, dalla migliore.
+        La selezione avviene nel motore Datalog con l'aggregato top_k (heap di n elementi),
+        senza ordinare tutte le attrazioni
+        """
+        X = Var('X')
+        Rating = Var('Rating')
+        if self.store == 'columnar':
+            return self.kb.relation('has_rating').nlargest(n, 1)[0].tolist()
+        results = self.kb.ask_all([Atom('top_k', [n, Rating, Atom('has_rating', [X, Rating])])])
+        return [result[X] for result in results]
+
+    def find_suitable_attractions_all(self, tourist_ids=None, processes=None):
+        """
+        Trova le attrazioni adatte a più turisti con un unico join invece di una query per turista
+
+        Args:
+            tourist_ids: turisti da considerare (default tutti quelli con almeno un'attrazione adatta)
+            processes: se > 1 partiziona i turisti tra più processi (solo con store='columnar')
+
+        Returns:
+            Dizionario id turista (str) -> lista di ID delle attrazioni adatte; turisti e attrazioni
+            sono nell'ordine dei dataset (o in quello di tourist_ids), qualunque sia la valutazione usata
+        """
+        selected = None if tourist_ids is None else [str(tourist_id) for tourist_id in tourist_ids]
+
+        if processes and processes > 1:
+            if self.store != 'columnar':
+                raise ValueError("Il partizionamento tra processi richiede store='columnar'")
+            ids = selected
+            if ids is None:
+                ids = self.kb.relation('tourist_likes')[0].unique().tolist()
+            # Ogni processo riceve solo i fatti tourist_likes dei propri turisti
+            partitions = [ids[i::processes] for i in range(processes)]
+            stores = [self.kb.restricted('tourist_likes', 0, part) for part in partitions if part]
+            grouped = {}
+            if stores:
+                with ProcessPoolExecutor(max_workers=len(stores)) as executor:
+                    for partial in executor.map(_suitable_by_tourist, stores):
+                        grouped.update(partial)
+        elif selected is not None and self.store == 'columnar':
+            grouped = _suitable_by_tourist(self.kb.restricted('tourist_likes', 0, selected))
+        elif self.views is not None:
+            # La vista materializzata contiene già il join completo
+            grouped = {}
+            for attraction_id, tourist_id in self.views.answers('suitable_for'):
+                grouped.setdefault(tourist_id, []).append(attraction_id)
+        else:
+            grouped = _suitable_by_tourist(self.kb)
+
+        attraction_ids = [] if self.attractions_df is None else self.attractions_df['id_attrazione'].tolist()
+        positions = {str(attraction_id): pos for pos, attraction_id in enumerate(attraction_ids)}
+
+        def in_dataset_order(attraction_ids):
+            return sorted(attraction_ids, key=lambda attraction_id: (positions.get(attraction_id, len(positions)),
+                                                                     attraction_id))
+
+        if selected is None:
+            tourist_ids = [] if self.tourists_df is None else self.tourists_df['id_turista'].tolist()
+            tourists = {str(tourist_id): None for tourist_id in tourist_ids}
+            selected = [tourist_id for tourist_id in tourists if tourist_id in grouped]
+            selected += sorted(tourist_id for tourist_id in grouped if tourist_id not in tourists)
+        return {tourist_id: in_dataset_order(grouped.get(tourist_id, [])) for tourist_id in selected}
+
+    def ask_magic(self, query):
+        """
+        Risponde a una query (lista di atomi) con valutazione bottom-up guidata dai magic sets:
+        le regole sono specializzate sugli argomenti legati della query, per cui
+        suitable_for(X, '7') deriva solo i fatti relativi al turista 7
+
+        Returns:
+            Lista di dizionari {variabile: valore} senza duplicati
+        """
+        if self.store == 'columnar':
+            # La base colonnare propaga già le costanti della query nei corpi delle regole
+            return self.kb.ask_all(query)
+        if self._magic is None:
+            self._magic = MagicEvaluator(self.kb)
+        return self._magic.ask_all(query)
+
+    def cache_info(self):
+        """
+        Statistiche della cache delle risposte della knowledge base
+
+        Returns:
+            CacheInfo(hits, misses, maxsize, currsize), o None con lo store colonnare
+        """
+        if self.store != 'kb':
+            return None
+        return self.kb.cache_info()
 
     def find_attractions_by_interest(self, interests):
         """Trova attrazioni in base agli interessi con ricerca flessibile"""
@@ -131,40 +591,20 @@ class DatalogReasoner:
             print("Nessun interesse specificato, restituisco tutte le attrazioni")
             return [str(id) for id in self.attractions_df['id_attrazione']]
 
-        # Normalizza tutti gli interessi a minuscolo per la ricerca
-        normalized_interests = [interest.lower() for interest in interests]
-
-        # Mappatura flessibile degli interessi a termini di ricerca
-        interest_terms = {
-            'arte': ['arte', 'museo', 'galleria', 'cappella', 'basilica'],
-            'storia': ['storia', 'antico', 'storico', 'romano', 'imperiale', 'foro', 'rovina'],
-            'natura': ['natura', 'villa', 'parco', 'giardino', 'verde'],
-            'divertimento': ['divertimento', 'svago', 'parco', 'world', 'bambini']
-        }
-
-        # Espandi gli interessi specificati ai termini di ricerca
-        search_terms = set()
-        for interest in normalized_interests:
-            if interest in interest_terms:
-                search_terms.update(interest_terms[interest])
+        # Ogni interesse noto è espanso nei suoi termini di ricerca; le corrispondenze
+        # sono unioni di liste di posting dell'indice (con la stessa semantica di sottostringa)
+        for interest in interests:
+            interest = interest.lower()
+            if interest in INTEREST_TERMS:
+                if interest not in self._interest_matches:
+                    self._interest_matches[interest] = self.text_index.search_any(INTEREST_TERMS[interest])
+                attraction_ids |= self._interest_matches[interest]
             else:
-                search_terms.add(interest)
-
-        # Cerca nelle descrizioni
-        for _, attr in self.attractions_df.iterrows():
-            description = attr['descrizione'].lower()
-            name = attr['nome'].lower()
-
-            # Verifica se i termini di ricerca sono presenti nella descrizione o nel nome
-            for term in search_terms:
-                if term in description or term in name:
-                    attraction_ids.add(str(attr['id_attrazione']))
-                    break
+                attraction_ids |= self.text_index.search(interest)
 
         # Se non è stato trovato nulla, restituisci le attrazioni con il rating più alto
         if not attraction_ids:
-            top_attractions = self.attractions_df.sort_values('recensione_media', ascending=False).head(5)
-            attraction_ids = set(str(id) for id in top_attractions['id_attrazione'])
+            attraction_ids = set(self.find_top_rated_attractions(5))
 
         return list(attraction_ids)
 
@@ -179,19 +619,24 @@ class DatalogReasoner:
         Returns:
             Lista di ID delle attrazioni
         """
-        attraction_ids = []
+        if self.database is not None:
+            return [str(attr_id) for attr_id in self.database.within_time(max_time_minutes, min_rating)]
+        return self.arrays.within_time(max_time_minutes, min_rating)
 
-        for _, attr in self.attractions_df.iterrows():
-            # Verifica tempo e rating
-            if attr['tempo_visita'] <= max_time_minutes and attr['recensione_media'] >= min_rating:
-                attraction_ids.append(str(attr['id_attrazione']))
-        return attraction_ids
+    def find_attractions_by_max_time_many(self, max_times, min_rating=3.5):
+        """
+        Come find_attractions_by_max_time per più soglie di tempo
+
+        Returns:
+            Neighbours (CSR) con una riga per soglia; row(i) dà la lista di ID
+        """
+        return self.arrays.within_time_many(max_times, min_rating)
 
     def get_tourist_by_id(self, tourist_id):
         """
         Restituisce un oggetto che rappresenta un turista con i suoi attributi
         """
-        # Carica il profilo del turista
+        # Carica il profilo del turista (ricerca nell'indice per ID)
         tourist_profile = get_tourist_profile(self.tourists_df, tourist_id)
 
         if not tourist_profile:
@@ -215,142 +660,106 @@ class DatalogReasoner:
 
         return TouristInfo(tourist_profile)
 
+    def get_attraction_details(self, attraction_id):
+        """
+        Restituisce il record condiviso di un'attrazione (accesso alle colonne come dizionario)
+        o None se non esiste
+        """
+        try:
+            record = self.attractions_by_id.get(str(int(attraction_id)))
+        except (TypeError, ValueError):
+            print(f"Errore: attraction_id '{attraction_id}' non è un intero valido.")
+            return None
+        if record is None:
+            print(f"Attenzione: Attrazione con ID {attraction_id} non trovata.")
+        return record
+
     def search_one(self, iri=None):
         """
         Simula la funzione search_one dell'ontologia
-        Cerca un'attrazione per ID o per nome
+        Cerca un'attrazione per ID o per nome nelle tabelle di lookup
         """
         if not iri:
             return None
 
-        try:
-            # Gestisci il caso di IRI nel formato "attraction_X"
-            if iri.startswith('attraction_'):
-                try:
-                    # Estrai l'ID numerico
-                    attr_id = int(iri.split('_')[1])
-                    # Cerca l'attrazione con questo ID
-                    attr = self.attractions_df[self.attractions_df['id_attrazione'] == attr_id]
-                    if not attr.empty:
-                        # Crea un oggetto attrazione
-                        class AttractionInfo:
-                            def __init__(self, details):
-                                self.id = str(details['id_attrazione'])
-                                self.name = details['nome']
-                                self.hasLatitude = [details['latitudine']]
-                                self.hasLongitude = [details['longitudine']]
-                                self.hasEstimatedVisitTime = [details['tempo_visita']]
-                                self.hasAverageRating = [details['recensione_media']]
-                                self.hasCategory = []
-
-                                # Aggiungi categorie in base alla descrizione
-                                desc = details['descrizione'].lower()
-                                if 'arte' in desc:
-                                    self.hasCategory.append('arte')
-                                if 'storia' in desc:
-                                    self.hasCategory.append('storia')
-                                if 'natura' in desc:
-                                    self.hasCategory.append('natura')
-                                if 'divertimento' in desc:
-                                    self.hasCategory.append('divertimento')
-
-                        return AttractionInfo(attr.iloc[0])
-                except (IndexError, ValueError) as e:
-                    print(f"Errore nell'elaborazione dell'IRI {iri}: {e}")
-                    return None
-
-            # Gestisci il caso di ricerca per nome (con o senza *)
-            if iri.startswith('*'):
-                # Rimuovi il carattere '*'
-                name = iri[1:]
-            else:
-                name = iri
-
-            # Prova a trovare un'attrazione con questo nome
-            match = self.attractions_df[self.attractions_df['nome'] == name]
-            if not match.empty:
-                # Crea un oggetto attrazione
-                class AttractionInfo:
-                    def __init__(self, details):
-                        self.id = str(details['id_attrazione'])
-                        self.name = details['nome']
-                        self.hasLatitude = [details['latitudine']]
-                        self.hasLongitude = [details['longitudine']]
-                        self.hasEstimatedVisitTime = [details['tempo_visita']]
-                        self.hasAverageRating = [details['recensione_media']]
-                        self.hasCategory = []
-
-                        # Aggiungi categorie in base alla descrizione
-                        desc = details['descrizione'].lower()
-                        if 'arte' in desc:
-                            self.hasCategory.append('arte')
-                        if 'storia' in desc:
-                            self.hasCategory.append('storia')
-                        if 'natura' in desc:
-                            self.hasCategory.append('natura')
-                        if 'divertimento' in desc:
-                            self.hasCategory.append('divertimento')
-
-                return AttractionInfo(match.iloc[0])
-        except Exception as e:
-            print(f"Errore nella ricerca dell'attrazione: {e}")
-
-        return None
+        # Gestisci il caso di IRI nel formato "attraction_X"
+        if iri.startswith('attraction_'):
+            try:
+                # Estrai l'ID numerico
+                attr_id = int(iri.split('_')[1])
+            except (IndexError, ValueError) as e:
+                print(f"Errore nell'elaborazione dell'IRI {iri}: {e}")
+                return None
+            record = self.attractions_by_id.get(str(attr_id))
+            if record is not None:
+                return record
+
+        # Gestisci il caso di ricerca per nome (con o senza *)
+        name = iri[1:] if iri.startswith('*') else iri
+        return self.attractions_by_name.get(name)
 
     def get_attractions_near(self, attraction_id, max_distance=1.0):
         """
         Trova attrazioni vicine a quella specificata
         """
         # Ottieni i dettagli dell'attrazione di origine
-        source_attr = get_attraction_details(self.attractions_df, attraction_id)
+        source_attr = self.get_attraction_details(attraction_id)
 
         if not source_attr:
             return []
 
-        source_coords = (source_attr['latitudine'], source_attr['longitudine'])
+        if self.database is not None:
+            return [str(attr_id) for attr_id in self.database.near(source_attr['latitudine'], source_attr['longitudine'],
+                                                                   max_distance, exclude_id=source_attr.id)]
 
-        # Trova attrazioni vicine
-        nearby_attractions = []
-        for _, attr in self.attractions_df.iterrows():
-            if attr['id_attrazione'] != int(attraction_id):
-                attr_coords = (attr['latitudine'], attr['longitudine'])
-                distance = geodesic(source_coords, attr_coords).kilometers
+        # Prefiltro vettoriale sulla sfera, distanza geodetica solo sui candidati
+        arrays = self.arrays
+        return arrays.ids[arrays.near(arrays.positions[source_attr.id], max_distance)].tolist()
 
-                if distance <= max_distance:
-                    nearby_attractions.append(str(attr['id_attrazione']))
-
-        return nearby_attractions
+    def get_attractions_near_many(self, attraction_ids, max_distance=1.0):
+        """
+        Trova le attrazioni vicine a ciascuna di quelle specificate
 
-    @property
-    def onto(self):
+        Returns:
+            Neighbours (CSR) con una riga per attrazione di origine (vuota se l'ID non esiste)
         """
-        Restituisce un riferimento a se stesso per compatibilità
-        (in originale restituirebbe l'oggetto ontologia)
+        arrays = self.arrays
+        positions = []
+        for attraction_id in attraction_ids:
+            try:
+                positions.append(arrays.positions.get(str(int(attraction_id))))
+            except (TypeError, ValueError):
+                positions.append(None)
+        return arrays.near_many(positions, max_distance)
+
+    def use_database(self, database):
         """
+        Delega a un SQLiteStore costruito dagli stessi CSV i filtri per tempo di visita,
+        vicinanza e costo, che diventano query sugli indici del database invece di
+        scansioni dei DataFrame (None per tornare ai filtri in memoria, il comportamento predefinito)
 
-        class MockOntology:
-            def __init__(self, reasoner):
-                self.reasoner = reasoner
-
-                class AttractionClass:
-                    def __init__(self, r):
-                        self.r = r
-
-                    def instances(self):
-                        """Restituisce tutte le istanze di attrazioni"""
-                        result = []
-                        for attr_id in range(1, len(self.r.attractions_df) + 1):
-                            attr = self.r.search_one(f"attraction_{attr_id}")
-                            if attr:
-                                result.append(attr)
-                        return result
-
-                self.Attraction = AttractionClass(reasoner)
+        ValueError se il database non è stato costruito dal contenuto attuale dei CSV del
+        contesto o se le attrazioni del reasoner sono state modificate con update_attraction
+        """
+        if database is not None:
+            paths = self.context.paths
+            if not database_is_fresh(database, paths['attractions'], paths['tourists']):
+                raise ValueError(f"Il database {database.path} non corrisponde ai CSV del reasoner "
+                                 f"({paths['attractions']}, {paths['tourists']})")
+            if self._owns_attractions:
+                raise ValueError("Attrazioni modificate con update_attraction: il database non è aggiornato")
+        self.database = database
 
-            def search_one(self, iri=None):
-                """
-                Delega la ricerca al reasoner
-                """
-                return self.reasoner.search_one(iri)
+    @property
+    def arrays(self):
+        """Colonne delle attrazioni come array NumPy (ricostruite dopo update_attraction)"""
+        if self._arrays is None:
+            self._arrays = AttractionArrays(self.attractions_df)
+        return self._arrays
 
-        return MockOntology(self)
\ No newline at end of file
+    @property
+    def onto(self):
+        """
+        Restituisce la facciata dell'ontologia (creata una sola volta)
+        """
+        return self._onto
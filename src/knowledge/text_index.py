@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+# Separatore tra i campi di un documento: nessun termine di ricerca lo contiene,
+# per cui una sottostringa non può attraversare due campi
+FIELD_SEPARATOR = '\x00'
+
+
+def trigrams(text):
+    """Restituisce l'insieme dei trigrammi di text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Indice invertito di trigrammi per la ricerca di sottostringhe.
+
+    Un termine di almeno tre caratteri può comparire solo nei documenti che contengono
+    tutti i suoi trigrammi: l'intersezione delle liste di posting dà i candidati, che
+    vengono poi verificati con il test di sottostringa. Il risultato è quindi identico
+    a `term in testo` su ogni documento, ma senza scandire tutti i documenti.
+    """
+
+    def __init__(self):
+        self.texts = {}  # chiave -> testo normalizzato
+        self.postings = defaultdict(set)  # trigramma -> chiavi dei documenti
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, key, *fields):
+        """Indicizza (o reindicizza) il documento key formato dai campi indicati"""
+        if key in self.texts:
+            self.remove(key)
+        text = FIELD_SEPARATOR.join(str(field).lower() for field in fields)
+        self.texts[key] = text
+        for gram in trigrams(text):
+            self.postings[gram].add(key)
+
+    def remove(self, key):
+        """Rimuove il documento key dall'indice"""
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self.postings[gram]
+
+    def search(self, term):
+        """Restituisce l'insieme delle chiavi dei documenti in cui term compare come sottostringa"""
+        term = term.lower()
+        if FIELD_SEPARATOR in term:
+            return set()
+        if len(term) < 3:
+            # Troppo corto per i trigrammi: scansione dei testi
+            return {key for key, text in self.texts.items() if term in text}
+
+        postings = sorted((self.postings.get(gram, set()) for gram in trigrams(term)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        return {key for key in candidates if term in self.texts[key]}
+
+    def search_any(self, terms):
+        """Restituisce le chiavi dei documenti che contengono almeno uno dei termini"""
+        result = set()
+        for term in terms:
+            result |= self.search(term)
+        return result
@@ -27,19 +27,8 @@ class ItineraryMDP:
         matching_attractions = []
 
         try:
-            # Ottieni tutte le attrazioni dalla ontologia
-            all_attractions = self.reasoner.onto.Attraction.instances()
-
-            # Filtra attrazioni per interessi
-            for attraction in all_attractions:
-                if not hasattr(attraction, 'hasCategory'):
-                    continue
-
-                for category in attraction.hasCategory:
-                    if category in interest_types:  # Confronta stringhe direttamente
-                        matching_attractions.append(attraction)
-                        break
-
+            # Attrazioni con almeno una categoria tra gli interessi (ricerca nell'indice per categoria)
+            matching_attractions = list(self.reasoner.onto.Attraction.instances_with_categories(interest_types))
 
             # Se ci sono meno di 3 attrazioni, cerca attrazioni con tempo di visita breve
             if len(matching_attractions) < 3:
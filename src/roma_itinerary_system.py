@@ -1,6 +1,10 @@
+import heapq
 import time
 
-from src.data.data_manager import load_attractions, load_tourists, get_tourist_profile, get_attraction_details
+from src.data.data_manager import get_tourist_profile
+from src.data.data_context import default_context
+from src.data.city_registry import default_registry
+from src.data.hot_reload import CatalogueSnapshot, HotReloader, DEFAULT_POLL_INTERVAL
 from src.knowledge.reasoning_module import DatalogReasoner
 from src.uncertainty.uncertainty_model import UncertaintyModel
 from src.learning.itinerary_agent import ItineraryAgent
@@ -10,20 +14,84 @@ from geopy.distance import geodesic
 class RomaItinerarySystem:
     """Sistema completo per la generazione di itinerari turistici a Roma"""
 
-    def __init__(self):
-        """Inizializza il sistema"""
+    def __init__(self, context=None, city=None, registry=None, use_snapshot=False, snapshot_dir=None):
+        """
+        Inizializza il sistema
+        context: DataContext con i dati condivisi (default quello del processo)
+        city: città del registro da servire (se indicata, context è ignorato)
+        registry: CityRegistry da cui prendere dati e reasoner della città (default quello del processo)
+        use_snapshot: se caricare il reasoner dallo snapshot su disco (e scriverlo se manca o è obsoleto);
+                      con city vale l'impostazione del registro
+        snapshot_dir: directory degli snapshot (default datasets/.cache)
+        """
         start_time = time.time()
 
-        # Carica i dati CSV
-        self.attractions_df = load_attractions()
-        self.tourists_df = load_tourists()
-        self.reasoner = DatalogReasoner()
+        snapshot_name = None
+        if city is not None:
+            # Dati e reasoner della città, caricati dal registro al primo accesso
+            registry = registry or default_registry()
+            context = registry.context(city)
+            reasoner = registry.reasoner(city)
+            snapshot_name = registry.snapshot_name(city)
+        else:
+            context = context or default_context()
+            if use_snapshot:
+                # Carica il reasoner dallo snapshot se i CSV e le regole non sono cambiati
+                reasoner = DatalogReasoner.load(snapshot_dir=snapshot_dir, context=context)
+            else:
+                reasoner = DatalogReasoner(context=context)
+        self.use_snapshot = registry.use_snapshot if city is not None else use_snapshot
+        self.snapshot_dir = registry.snapshot_dir if city is not None else snapshot_dir
+        self.city = city
+        self.registry = registry if city is not None else None
+
+        # Dati in servizio: sostituiti in blocco dal ricaricamento a caldo
+        self.snapshot = CatalogueSnapshot(0, context, reasoner, snapshot_name)
+        self.reloader = None
 
         # Inizializza modello di incertezza
         self.uncertainty_model = UncertaintyModel()
 
-        # Dizionario per agenti RL addestrati
-        self.agents = {}
+    @property
+    def context(self):
+        return self.snapshot.context
+
+    @property
+    def reasoner(self):
+        return self.snapshot.reasoner
+
+    @property
+    def attractions_df(self):
+        return self.snapshot.attractions_df
+
+    @property
+    def tourists_df(self):
+        return self.snapshot.tourists_df
+
+    @property
+    def agents(self):
+        """Agenti RL addestrati sui dati in servizio (scartati a ogni ricaricamento)"""
+        return self.snapshot.cache('agents', dict)
+
+    def enable_hot_reload(self, poll_interval=DEFAULT_POLL_INTERVAL, start=True):
+        """
+        Attiva il ricaricamento a caldo dei CSV: quando cambiano, reasoner e indici sono
+        ricostruiti in background e sostituiti ai precedenti senza riavviare il sistema
+        poll_interval: secondi tra due controlli dei file
+        start: se False i file sono controllati solo chiamando self.reloader.check()
+        """
+        if self.reloader is None:
+            self.reloader = HotReloader(self.snapshot, poll_interval=poll_interval, snapshot_dir=self.snapshot_dir,
+                                        on_swap=self._publish, use_snapshot=self.use_snapshot)
+        if start:
+            self.reloader.start()
+        return self.reloader
+
+    def _publish(self, snapshot):
+        self.snapshot = snapshot
+        if self.registry is not None:
+            # Il registro serve la nuova versione agli altri utenti della città
+            self.registry.publish(self.city, snapshot.context, snapshot.reasoner)
 
     def print_itinerary(self, itinerary):
         """Stampa un itinerario in formato leggibile"""
@@ -84,8 +152,13 @@ class RomaItinerarySystem:
         """
         print(f"\nGenerazione itinerario per turista {tourist_id}...")
 
+        # La richiesta usa una sola versione dei dati anche se nel frattempo vengono ricaricati
+        snapshot = self.snapshot
+        reasoner = snapshot.reasoner
+        agents = snapshot.cache('agents', dict)
+
         # Ottieni il profilo del turista
-        tourist_profile = get_tourist_profile(self.tourists_df, tourist_id)
+        tourist_profile = get_tourist_profile(snapshot.tourists_df, tourist_id)
         if not tourist_profile:
             print(f"Turista con ID {tourist_id} non trovato!")
             return []
@@ -102,12 +175,12 @@ class RomaItinerarySystem:
         if use_rl:
 
             # Verifica se l'agente è già addestrato
-            if tourist_id not in self.agents:
-                self.agents[tourist_id] = ItineraryAgent(tourist_id, self.reasoner, self.uncertainty_model)
-                self.agents[tourist_id].train(num_episodes=50)
+            if tourist_id not in agents:
+                agents[tourist_id] = ItineraryAgent(tourist_id, reasoner, self.uncertainty_model)
+                agents[tourist_id].train(num_episodes=50)
 
             # Genera itinerario
-            attraction_ids, reward = self.agents[tourist_id].generate_itinerary(time_of_day, day_of_week)
+            attraction_ids, reward = agents[tourist_id].generate_itinerary(time_of_day, day_of_week)
             print(f"Itinerario generato con reward: {reward}")
 
             # Converti in formato utilizzabile
@@ -118,20 +191,15 @@ class RomaItinerarySystem:
                     if '_' in attr_id:
                         num_id = attr_id.split('_')[1]
                     else:
-                        # Se è un nome di attrazione, cerca nell'elenco attrazioni
-                        found = False
-                        for idx, row in self.attractions_df.iterrows():
-                            if row['nome'] == attr_id:
-                                num_id = str(row['id_attrazione'])
-                                found = True
-                                break
-
-                        if not found:
+                        # Se è un nome di attrazione, cerca nella tabella nome -> attrazione
+                        record = reasoner.attractions_by_name.get(attr_id)
+                        if record is None:
                             print(f"ATTENZIONE: Non riesco a trovare l'ID per {attr_id}, ignoro questa attrazione")
                             continue
+                        num_id = record.id
 
                     # Ottieni dettagli
-                    details = get_attraction_details(self.attractions_df, num_id)
+                    details = reasoner.get_attraction_details(num_id)
                     if details:
                         selected_attractions.append({
                             'id': num_id,
@@ -160,7 +228,7 @@ class RomaItinerarySystem:
                 interests.append('divertimento')  # In italiano minuscolo
 
             # Query all'ontologia
-            attractions = self.reasoner.find_attractions_by_interest(interests)
+            attractions = reasoner.find_attractions_by_interest(interests)
 
             # Filtro per rating e costo
             filtered_attractions = []
@@ -173,7 +241,7 @@ class RomaItinerarySystem:
                     # Se attr è un oggetto con attributo name (comportamento precedente)
                     attr_id = attr.name.split('_')[1] if hasattr(attr, 'name') and '_' in attr.name else str(attr)
 
-                details = get_attraction_details(self.attractions_df, attr_id)
+                details = reasoner.get_attraction_details(attr_id)
 
                 # Considera solo attrazioni con rating sufficiente
                 if details and details['recensione_media'] >= 3.0:
@@ -195,11 +263,9 @@ class RomaItinerarySystem:
                 # Ottieni le attrazioni con il rating più alto che non sono già incluse
                 already_included_ids = set(attr['id'] for attr in filtered_attractions)
 
-                for _, row in self.attractions_df.sort_values(by='recensione_media', ascending=False).head(
-                        5).iterrows():
-                    attr_id = str(row['id_attrazione'])
+                for attr_id in reasoner.find_top_rated_attractions(5):
                     if attr_id not in already_included_ids:
-                        details = get_attraction_details(self.attractions_df, attr_id)
+                        details = reasoner.get_attraction_details(attr_id)
                         if details:
                             filtered_attractions.append({
                                 'id': attr_id,
@@ -212,9 +278,8 @@ class RomaItinerarySystem:
                                 'categoria': details.get('categoria', '')  # Categoria se presente nel dataset
                             })
 
-            # Ordina per rating e prendi le migliori
-            filtered_attractions.sort(key=lambda a: a['rating'], reverse=True)
-            selected_attractions = filtered_attractions[:10]  # Limita a 10 per efficienza
+            # Prendi le migliori per rating (top-k con heap, senza ordinare tutta la lista)
+            selected_attractions = heapq.nlargest(10, filtered_attractions, key=lambda a: a['rating'])
 
 
         # Se non ci sono attrazioni selezionate, termina
@@ -365,7 +430,7 @@ class RomaItinerarySystem:
 if __name__ == "__main__":
     # Crea il sistema
     start_time = time.time()
-    system = RomaItinerarySystem()
+    system = RomaItinerarySystem(use_snapshot=True)
     print(f"Tempo di inizializzazione: {time.time() - start_time:.2f} secondi")
 
     # Genera itinerario per il turista 1 (weekend pomeriggio)
@@ -1,4 +1,5 @@
 from typing import Dict, List, Any, Union
+import numpy as np
 
 class Variable:
     """Rappresenta una variabile in un modello probabilistico"""
@@ -6,6 +7,17 @@ class Variable:
         self.name = name
         self.values = values
 
+class Factor:
+    """Fattore su un insieme di variabili: tabella NumPy con un asse per variabile"""
+    def __init__(self, variables: List[Variable], table: np.ndarray):
+        self.variables = variables
+        self.table = table
+
+    def restrict(self, evidence: Dict[Variable, int]):
+        """Fattore con le variabili osservate fissate (selezione per indice, senza copie)"""
+        index = tuple(evidence.get(var, slice(None)) for var in self.variables)
+        return Factor([var for var in self.variables if var not in evidence], self.table[index])
+
 class Prob:
     """Rappresenta una distribuzione di probabilità condizionale"""
     def __init__(self, variable: Variable, parents: List[Variable], probabilities: Dict[Union[str, tuple], Dict[str, float]]):
@@ -13,6 +25,24 @@ class Prob:
         self.parents = parents
         self.probabilities = probabilities
 
+    def to_factor(self) -> Factor:
+        """
+        Compila la CPT in un Factor con assi (genitori..., variabile); le chiavi delle righe
+        sono tuple di valori dei genitori (o il solo valore se c'è un genitore)
+        """
+        shape = [len(parent.values) for parent in self.parents] + [len(self.variable.values)]
+        table = np.zeros(shape)
+        for index in np.ndindex(*shape[:-1]):
+            parent_values = tuple(parent.values[i] for parent, i in zip(self.parents, index))
+            if not parent_values:
+                row = self.probabilities
+            elif parent_values in self.probabilities:
+                row = self.probabilities[parent_values]
+            else:
+                row = self.probabilities[parent_values[0]]
+            table[index] = [row[value] for value in self.variable.values]
+        return Factor(self.parents + [self.variable], table)
+
 class BeliefNetwork:
     """Rappresenta una Belief Network probabilistica"""
     def __init__(self, name: str, variables: set, factors: set):
@@ -20,19 +50,125 @@ class BeliefNetwork:
         self.variables = variables
         self.factors = factors
 
-class ProbRC:
-    """Implementazione semplificata di Recursive Conditioning per inferenza"""
+class VariableElimination:
+    """
+    Inferenza esatta per eliminazione di variabili.
+
+    Le CPT sono compilate una sola volta in tabelle NumPy. Per ogni query si scartano le
+    variabili che non sono antenate della variabile interrogata o delle evidenze, le
+    evidenze sono applicate selezionando le righe delle tabelle e le variabili rimanenti
+    sono eliminate nell'ordine min-fill (prodotto e somma in un'unica einsum). I risultati
+    sono memorizzati per (variabile, evidenze): la rete non deve cambiare dopo la creazione.
+    """
     def __init__(self, belief_network):
         self.bn = belief_network
+        self.variables = {var.name: var for var in belief_network.variables}
+        self.factors = [prob.to_factor() for prob in belief_network.factors]
+        self.parents = {prob.variable: prob.parents for prob in belief_network.factors}
+        self._results = {}
+
+    def _evidence_indices(self, evidence) -> Dict[Variable, int]:
+        """Evidenze come variabile -> indice del valore (le chiavi possono essere variabili o nomi)"""
+        indices = {}
+        for key, value in evidence.items():
+            name = key.name if isinstance(key, Variable) else key
+            if name not in self.variables:
+                raise ValueError(f"Variabile sconosciuta nelle evidenze: {name}")
+            var = self.variables[name]
+            if value not in var.values:
+                raise ValueError(f"Valore {value} non valido per {name}: {var.values}")
+            indices[var] = var.values.index(value)
+        return indices
+
+    def _relevant(self, variables):
+        """Variabili indicate e loro antenati (le altre si sommano a 1 e non servono)"""
+        relevant = set()
+        stack = list(variables)
+        while stack:
+            var = stack.pop()
+            if var not in relevant:
+                relevant.add(var)
+                stack.extend(self.parents.get(var, []))
+        return relevant
 
-    def query(self, variable, evidence: Dict[str, str] = {}):
+    @staticmethod
+    def _min_fill_order(factors, keep):
+        """Ordine di eliminazione min-fill sul grafo delle interazioni (keep non viene eliminata)"""
+        neighbours = {}
+        for factor in factors:
+            for var in factor.variables:
+                neighbours.setdefault(var, set()).update(v for v in factor.variables if v is not var)
+
+        def fill(var):
+            # Archi da aggiungere tra i vicini di var se var venisse eliminata
+            adjacent = list(neighbours[var])
+            return sum(1 for i, a in enumerate(adjacent) for b in adjacent[i + 1:] if b not in neighbours[a])
+
+        order = []
+        remaining = [var for var in neighbours if var is not keep]
+        while remaining:
+            var = min(remaining, key=fill)
+            adjacent = neighbours.pop(var)
+            for a in adjacent:
+                neighbours[a] |= adjacent - {a}
+                neighbours[a].discard(var)
+            remaining.remove(var)
+            order.append(var)
+        return order
+
+    @staticmethod
+    def _multiply(factors, eliminate=None):
+        """Prodotto dei fattori sommando via la variabile eliminate (se indicata)"""
+        letters = {}
+        for factor in factors:
+            for var in factor.variables:
+                letters.setdefault(var, chr(ord('a') + len(letters)))
+        output = [var for var in letters if var is not eliminate]
+        operands = []
+        for factor in factors:
+            operands.append(factor.table)
+            operands.append([ord(letters[var]) - ord('a') for var in factor.variables])
+        table = np.einsum(*operands, [ord(letters[var]) - ord('a') for var in output])
+        return Factor(output, table)
+
+    def query(self, variable, evidence: Dict[Any, str] = {}):
         """
-        Query probabilistica semplificata
-        Restituisce una distribuzione di probabilità approssimata
+        Distribuzione a posteriori di variable date le evidenze
+
+        Args:
+            variable: Variable da interrogare
+            evidence: dizionario variabile (o nome) -> valore osservato
+
+        Returns:
+            Dizionario valore -> probabilità
         """
-        # Implementazione base - da raffinare
-        default_distribution = {val: 1.0/len(variable.values) for val in variable.values}
-        return default_distribution
+        indices = self._evidence_indices(evidence)
+        key = (variable.name, frozenset((var.name, i) for var, i in indices.items()))
+        result = self._results.get(key)
+        if result is not None:
+            return dict(result)
+
+        if variable in indices:
+            result = {value: float(i == indices[variable]) for i, value in enumerate(variable.values)}
+        else:
+            relevant = self._relevant([variable, *indices])
+            factors = [factor.restrict({var: i for var, i in indices.items() if var in factor.variables})
+                       for factor in self.factors if factor.variables[-1] in relevant]
+            for var in self._min_fill_order(factors, variable):
+                related = [factor for factor in factors if var in factor.variables]
+                factors = [factor for factor in factors if var not in factor.variables]
+                factors.append(self._multiply(related, eliminate=var))
+            table = self._multiply(factors).table
+            total = table.sum()
+            if total == 0:
+                raise ValueError("Evidenze con probabilità nulla")
+            result = dict(zip(variable.values, (table / total).tolist()))
+
+        self._results[key] = result
+        return dict(result)
+
+# Nome precedente del motore di inferenza
+ProbRC = VariableElimination
 
 class UncertaintyModel:
     """Modello di incertezza basato su Belief Network"""
@@ -85,8 +221,8 @@ class UncertaintyModel:
 
         self.bn = BeliefNetwork("Tourism Uncertainty Model", variables, factors)
 
-        # Inferenza usando ProbRC (recursive conditioning)
-        self.inference = ProbRC(self.bn)
+        # Inferenza esatta per eliminazione di variabili
+        self.inference = VariableElimination(self.bn)
 
     def get_traffic_distribution(self, evidence: Dict[str, str] = {}):
         """Calcola la distribuzione del traffico date le evidenze"""